@@ -3,40 +3,114 @@
 #----------------------------------------------------------------------------#
 
 import json
-from operator import itemgetter
-from typing import final
+import os
+import click
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain, groupby
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+from babel.dates import parse_pattern
+from flask import (Blueprint, Flask, Response, abort, current_app, flash, jsonify,
+                   redirect, render_template, request, stream_with_context, url_for)
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from models import *
-from operator import itemgetter
+from forms import ArtistForm, ShowForm, VenueForm
+from models import (db, Artist, Show, Venue, artist_genres, venue_genres, artist_matches,
+                    venue_matches, deletions, index_changes, log_index_changes)
+from database import engine_options, init_replica_routing, load_secret_key
+from conditional import (conditional, venues_validators, artists_validators,
+                         shows_validators, venue_validators, artist_validators,
+                         venue_calendar_validators, artist_calendar_validators)
+from genres import resolve_genres
+from query_budget import query_budget
+from instrumentation import init_instrumentation
+import assets
+from response_cache import ResponseCache
+from streaming import iterate, render_listing
+import bookings
+import calendars
+import counters
+import facets
+from facets import FacetIndex
+import geo
+from geo import GridIndex
+import search_index
+from search_index import PrefixIndex, TrigramIndex
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
+DATETIME_LOCALE = babel.Locale.parse('en')
+
+# Babel patterns are compiled once instead of on every call
+DATETIME_PATTERNS = {
+    'full': parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+    'medium': parse_pattern("EE MM, dd, y h:mma"),
+}
+
+
+# takes datetime objects straight from the models; strings are still parsed.
+# create_app() registers it memoized, as show pages repeat the same few
+# timestamps
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    pattern = DATETIME_PATTERNS.get(format) or parse_pattern(format)
+    return pattern.apply(value, DATETIME_LOCALE)
+
+#----------------------------------------------------------------------------#
+# Search indexes.
+#----------------------------------------------------------------------------#
 
+venue_index = TrigramIndex(Venue)
+artist_index = TrigramIndex(Artist)
+search_index.track(venue_index)
+search_index.track(artist_index)
+
+# typeahead completions for /api/autocomplete
+venue_prefixes = PrefixIndex(Venue)
+artist_prefixes = PrefixIndex(Artist)
+search_index.track(venue_prefixes)
+search_index.track(artist_prefixes)
+search_index.track_upcoming(venue_prefixes, Show, 'venue_id')
+search_index.track_upcoming(artist_prefixes, Show, 'artist_id')
+search_index.track_cascaded_upcoming(venue_prefixes, Artist, Show.artist_id, Show.venue_id)
+search_index.track_cascaded_upcoming(artist_prefixes, Venue, Show.venue_id, Show.artist_id)
+
+# genre facet counts for /venues and /artists
+venue_facets = FacetIndex(Venue, venue_genres.c.venue_id)
+artist_facets = FacetIndex(Artist, artist_genres.c.artist_id)
+facets.track(venue_facets)
+facets.track(artist_facets)
+
+# venues by distance for /venues/nearby
+venue_grid = GridIndex(Venue)
+search_index.track(venue_grid)
+
+SEARCH_INDEXES = (venue_index, artist_index, venue_prefixes, artist_prefixes,
+                  venue_facets, artist_facets, venue_grid)
+
+# for the indexes of the other processes, see search_index.IndexSync
+search_index.log_changes(log_index_changes)
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+cache = ResponseCache()
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+# commands are registered at the top level: `flask import`, not `flask main import`
+bp = Blueprint('main', __name__, cli_group=None)
 
-@app.route('/')
+
+@bp.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -44,65 +118,173 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-# displays list of venues
-@app.route('/venues')
-def venues():
-    data = []
-    # get all venues
-    venues = Venue.query.all()
-
-    # get all locations and add to data
-    locations = set()
-    for venue in venues:
-        locations.add((venue.city, venue.state))
-
-    # sort the list by state first and then the city
-    locations = list(locations)
-    locations.sort(key=itemgetter(1, 0))
-
-    for location in locations:
-        data.append({
-            'city': location[0],
-            'state': location[1],
-            'venues': []
+# the ?genre= (repeatable), ?city= and ?state= filters of a listing page
+def listing_filters():
+    return (request.args.getlist('genre'),
+            request.args.get('city', '').strip() or None,
+            request.args.get('state', '').strip() or None)
+
+
+# the genres to narrow a listing page by, most matches first, each linking
+# to the page with that genre added to or taken out of the filter
+def genre_facets(index, endpoint, selected, city, state):
+    counts = index.counts(selected, city, state)
+    if counts is None:
+        # index not built yet
+        counts = facets.query_counts(index.model, index.owner_column, selected, city, state)
+    total, by_genre = counts
+
+    genres = []
+    for name in set(by_genre) | set(selected):
+        count = by_genre.get(name, 0)
+        if not count and name not in selected:
+            continue
+        chosen = [other for other in selected if other != name] \
+            if name in selected else selected + [name]
+        genres.append({
+            'name': name,
+            'count': count,
+            'selected': name in selected,
+            'url': url_for(endpoint, genre=chosen, city=city, state=state)
         })
+    genres.sort(key=lambda genre: (-genre['count'], genre['name']))
+    return {'total': total, 'genres': genres, 'selected': selected,
+            'city': city, 'state': state}
 
-    curr = datetime.now()
-    # add venue to data
-    for venue in venues:
-        num_upcoming_shows = 0
-        shows = Show.query.filter_by(venue_id=venue.id).all()
-
-        # calculate # of upcoming show
-        for show in shows:
-            if show.start_time > curr:
-                num_upcoming_shows += 1
-
-        for location in data:
-            if location['city'] == venue.city and location['state'] == venue.state:
-                location['venues'].append({
-                    'id': venue.id,
-                    'name': venue.name,
-                    'num_upcoming_shows': num_upcoming_shows
-                })
 
-    return render_template('pages/venues.html', areas=data)
+# displays list of venues
+@bp.route('/venues')
+@conditional(venues_validators)
+@cache.cached('venues')
+@query_budget(2)
+def venues():
+    selected, city, state = listing_filters()
+    # upcoming show counts are kept on the venue rows, see counters.py
+    rows = iterate(db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                    Venue.upcoming_shows_count)
+                   .filter(*facets.filters(Venue, venue_genres.c.venue_id,
+                                           selected, city, state))
+                   .order_by(Venue.state, Venue.city, Venue.id))
+    return render_listing(
+        'pages/venues.html', areas=venue_areas(rows),
+        facets=genre_facets(venue_facets, 'main.venues', selected, city, state))
+
+
+# rows are sorted by state first and then the city, so the areas come out in
+# that order while grouping the venues in a single pass. Each area's venues
+# are read off the same cursor, so the template has to list them before
+# moving on to the next area
+def venue_areas(rows):
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': ({
+                'id': venue_id,
+                'name': name,
+                'num_upcoming_shows': upcoming
+            } for venue_id, name, _, _, upcoming in venues)
+        }
 
 
-@app.route('/venues/search', methods=['POST'])
+@bp.route('/venues/search', methods=['POST'])
+@query_budget(1)
 def search_venues():
     search_term = request.form.get('search_term', '').strip()
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
+    venues = venue_index.search(search_term)
+    if venues is None:
+        # index not built yet
+        venues = db.session.query(Venue.id, Venue.name) \
+            .filter(Venue.name.ilike(f'%{search_term}%')).order_by(Venue.id).all()
     response = {
         'count': len(venues),
-        'data': [{'id': venue.id, 'name': venue.name} for venue in venues]
+        'data': [{'id': id, 'name': name} for id, name in venues]
     }
     return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
-@app.route('/venues/<int:venue_id>')
+# a number in [low, high] from the query string, or default when it is not
+# given
+def float_arg(name, low, high, default=None):
+    value = request.args.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        abort(400)
+    if not low <= value <= high:
+        abort(400)
+    return value
+
+
+def nearby_radius():
+    return float_arg('radius', 0.1, current_app.config['NEARBY_MAX_RADIUS_KM'],
+                     current_app.config['NEARBY_RADIUS_KM'])
+
+
+# the NEARBY_LIMIT closest venues within radius km of (lat, lng). The grid
+# index finds them without reading the venues table; only the rows listed
+# are fetched, in one query
+def venues_near(lat, lng, radius):
+    limit = current_app.config['NEARBY_LIMIT']
+    found = venue_grid.near(lat, lng, radius, limit)
+    if found is None:
+        # index not built yet
+        found = geo.query_near(Venue, lat, lng, radius, limit)
+    if not found:
+        return []
+    rows = {row.id: row for row in db.session.query(
+        Venue.id, Venue.name, Venue.address, Venue.city, Venue.state)
+        .filter(Venue.id.in_([id for _, id in found]))}
+    return [{
+        'id': id,
+        'name': rows[id].name,
+        'address': rows[id].address,
+        'city': rows[id].city,
+        'state': rows[id].state,
+        'distance': distance
+    } for distance, id in found if id in rows]
+
+
+# venues within ?radius= km of ?lat= and ?lng=, closest first
+@bp.route('/venues/nearby')
+@conditional(venues_validators)
+@cache.cached('venues')
+@query_budget(2)
+def nearby_venues():
+    lat = float_arg('lat', -90, 90)
+    lng = float_arg('lng', -180, 180)
+    radius = nearby_radius()
+    located = lat is not None and lng is not None
+    return render_template(
+        'pages/nearby_venues.html', title='Venues nearby', artist=None,
+        lat=lat, lng=lng, radius=radius,
+        venues=venues_near(lat, lng, radius) if located else None)
+
+
+# the best matches `flask matches` stored for a seeking venue or artist,
+# best first. Those that stopped seeking since the last run are left out
+def matches_of(owner_column, match_column, owner_id, model, seeking):
+    score = owner_column.table.c.score
+    return [{'id': id, 'name': name, 'image_link': image_link, 'city': city, 'state': state}
+            for id, name, image_link, city, state in db.session.query(
+                model.id, model.name, model.image_link, model.city, model.state)
+            .join(owner_column.table, match_column == model.id)
+            .filter(owner_column == owner_id, seeking.is_(True))
+            .order_by(score.desc(), model.id)]
+
+
+@bp.route('/venues/<int:venue_id>')
+@conditional(venue_validators)
+@cache.cached('venue:{venue_id}')
+@query_budget(4)
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    # load genres and shows with their artists up front: one query each
+    venue = Venue.query.options(
+        db.selectinload(Venue.genres),
+        db.selectinload(Venue.shows).joinedload(Show.artist)
+    ).get_or_404(venue_id)
     genres = [genre.name for genre in venue.genres]
     curr = datetime.now()
     past_shows = []
@@ -113,7 +295,7 @@ def show_venue(venue_id):
             'artist_id': artist.id,
             'artist_name': artist.name,
             'artist_image_link': artist.image_link,
-            'start_time': format_datetime(str(show.start_time))
+            'start_time': show.start_time
         }
         if show.start_time <= curr:
             past_shows.append(show_detail)
@@ -136,7 +318,9 @@ def show_venue(venue_id):
         'past_shows': past_shows,
         'upcoming_shows': upcoming_shows,
         'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
+        'upcoming_shows_count': len(upcoming_shows),
+        'matches': matches_of(venue_matches.c.venue_id, venue_matches.c.artist_id, venue_id,
+                              Artist, Artist.seeking_venue) if venue.seeking_talent else []
     }
     return render_template('pages/show_venue.html', venue=data)
 
@@ -144,13 +328,13 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # get the form data
     form = VenueForm(request.form)
@@ -162,6 +346,8 @@ def create_venue_submission():
     city = form.city.data
     state = form.state.data
     address = form.address.data
+    latitude = form.latitude.data
+    longitude = form.longitude.data
     phone = form.phone.data
     genres = form.genres.data
     image_link = form.image_link.data
@@ -173,24 +359,16 @@ def create_venue_submission():
     # check if errors in form validation
     if not form.validate():
         flash(form.errors)
-        return redirect(url_for('create_venue_submission'))
+        return redirect(url_for('main.create_venue_submission'))
     else:
         error = False
         try:
-            venue = Venue(name=name, city=city, state=state, address=address, phone=phone, seeking_talent=seeking_talent,
-                          seeking_description=seeking_description, image_link=image_link, website_link=website_link, facebook_link=facebook_link)
-
-            # create genres
-            for genre in genres:
-                print(genre)
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    venue.genres.append(fetch_genre)
-                else:
-                    # return none, create
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    venue.genres.append(new_genre)
+            venue = Venue(name=name, city=city, state=state, address=address, latitude=latitude, longitude=longitude,
+                          phone=phone, seeking_talent=seeking_talent, seeking_description=seeking_description,
+                          image_link=image_link, website_link=website_link, facebook_link=facebook_link)
+
+            # look up or create genres
+            venue.genres = resolve_genres(genres)
 
             db.session.add(venue)
             db.session.commit()
@@ -203,20 +381,19 @@ def create_venue_submission():
 
         if not error:
             flash('Venue ' + name + ' was successfully listed!')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('An error occurred. Venue ' + name + ' could not be listed.')
             abort(500)
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     error = False
     try:
         venue = Venue.query.get(venue_id)
         venue_name = venue.name
-        for show in venue.shows:
-            db.session.delete(show)
+        # shows and genre links go with it through ON DELETE CASCADE
         db.session.delete(venue)
         db.session.commit()
     except:
@@ -229,7 +406,7 @@ def delete_venue(venue_id):
         flash('Venue ' + venue_name + ' was deleted')
         return jsonify({
             'deleted': True,
-            'url': url_for('venues')
+            'url': url_for('main.venues')
         })
     else:
         flash('An error occurred. Venue ' +
@@ -242,33 +419,47 @@ def delete_venue(venue_id):
 # displays list of artists
 
 
-@app.route('/artists')
+@bp.route('/artists')
+@conditional(artists_validators)
+@cache.cached('artists')
+@query_budget(2)
 def artists():
-    artists = Artist.query.order_by(Artist.name).all()
-    data = []
-
-    for artist in artists:
-        data.append({
-            'id': artist.id,
-            'name': artist.name
-        })
-    return render_template('pages/artists.html', artists=data)
-
-
-@app.route('/artists/search', methods=['POST'])
+    selected, city, state = listing_filters()
+    artists = iterate(db.session.query(Artist.id, Artist.name)
+                      .filter(*facets.filters(Artist, artist_genres.c.artist_id,
+                                              selected, city, state))
+                      .order_by(Artist.name))
+    return render_listing(
+        'pages/artists.html', artists=artists,
+        facets=genre_facets(artist_facets, 'main.artists', selected, city, state))
+
+
+@bp.route('/artists/search', methods=['POST'])
+@query_budget(1)
 def search_artists():
     search_term = request.form.get('search_term', '').strip()
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
+    artists = artist_index.search(search_term)
+    if artists is None:
+        # index not built yet
+        artists = db.session.query(Artist.id, Artist.name) \
+            .filter(Artist.name.ilike(f'%{search_term}%')).order_by(Artist.id).all()
     response = {
         'count': len(artists),
-        'data': [{'id': artist.id, 'name': artist.name} for artist in artists]
+        'data': [{'id': id, 'name': name} for id, name in artists]
     }
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+@conditional(artist_validators)
+@cache.cached('artist:{artist_id}')
+@query_budget(4)
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    # load genres and shows with their venues up front: one query each
+    artist = Artist.query.options(
+        db.selectinload(Artist.genres),
+        db.selectinload(Artist.shows).joinedload(Show.venue)
+    ).get_or_404(artist_id)
     genres = [genre.name for genre in artist.genres]
     past_shows = []
     upcoming_shows = []
@@ -279,7 +470,7 @@ def show_artist(artist_id):
             'venue_id': venue.id,
             'venue_name': venue.name,
             'venue_image_link': venue.image_link,
-            'start_time': format_datetime(str(show.start_time))
+            'start_time': show.start_time
         }
         if show.start_time <= curr:
             past_shows.append(show_detail)
@@ -301,15 +492,36 @@ def show_artist(artist_id):
         'past_shows': past_shows,
         'upcoming_shows': upcoming_shows,
         'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
+        'upcoming_shows_count': len(upcoming_shows),
+        'matches': matches_of(artist_matches.c.artist_id, artist_matches.c.venue_id, artist_id,
+                              Venue, Venue.seeking_talent) if artist.seeking_venue else []
     }
     return render_template('pages/show_artist.html', artist=data)
 
+
+# venues around the artist's city, closest first. Artists not located by
+# `flask geocode` yet are placed in the middle of their city's venues
+@bp.route('/artists/<int:artist_id>/venues/nearby')
+@cache.cached('artist:{artist_id}', 'venues')
+@query_budget(4)
+def artist_nearby_venues(artist_id):
+    artist = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state,
+                              Artist.latitude, Artist.longitude) \
+        .filter(Artist.id == artist_id).first_or_404()
+    lat, lng = artist.latitude, artist.longitude
+    if lat is None or lng is None:
+        lat, lng = geo.city_center(Venue, artist.city, artist.state)
+    radius = nearby_radius()
+    return render_template(
+        'pages/nearby_venues.html', title=f'Venues near {artist.city}, {artist.state}',
+        artist=artist, lat=lat, lng=lng, radius=radius,
+        venues=venues_near(lat, lng, radius) if lat is not None else None)
+
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
     form = ArtistForm(obj=artist)
@@ -320,7 +532,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist_data)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     form = ArtistForm(request.form)
     name = form.name.data
@@ -337,11 +549,15 @@ def edit_artist_submission(artist_id):
     # redirect if errors in form validation
     if not form.validate():
         flash(form.errors)
-        return redirect(url_for('edit_artist_submission', artist_id=artist_id))
+        return redirect(url_for('main.edit_artist_submission', artist_id=artist_id))
     else:
         error = False
         try:
             artist = Artist.query.get(artist_id)
+            if (city, state) != (artist.city, artist.state):
+                # located again by `flask geocode`; until then by the
+                # venues of the new city
+                artist.latitude = artist.longitude = None
             artist.name = name
             artist.city = city
             artist.state = state
@@ -352,15 +568,7 @@ def edit_artist_submission(artist_id):
             artist.seeking_venue = seeking_venue
             artist.seeking_description = seeking_description
 
-            artist.genres.clear()
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    artist.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    artist.genres.append(new_genre)
+            artist.genres = resolve_genres(genres)
 
             db.session.commit()
         except Exception as e:
@@ -372,13 +580,13 @@ def edit_artist_submission(artist_id):
 
         if not error:
             flash('The Artist ' + name + ' has been successfully updated!')
-            return redirect(url_for('show_artist', artist_id=artist_id))
+            return redirect(url_for('main.show_artist', artist_id=artist_id))
         else:
             flash('An error has occured and update failed')
             abort(500)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
     form = VenueForm(obj=venue)
@@ -389,13 +597,15 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     form = VenueForm(request.form)
     name = form.name.data
     city = form.city.data
     state = form.state.data
     address = form.address.data
+    latitude = form.latitude.data
+    longitude = form.longitude.data
     phone = form.phone.data
     genres = form.genres.data
     image_link = form.image_link.data
@@ -406,7 +616,7 @@ def edit_venue_submission(venue_id):
 
     if not form.validate():
         flash(form.errors)
-        return redirect(url_for('edit_venue_submission', venue_id=venue_id))
+        return redirect(url_for('main.edit_venue_submission', venue_id=venue_id))
     else:
         error = False
 
@@ -416,6 +626,8 @@ def edit_venue_submission(venue_id):
             venue.city = city
             venue.state = state
             venue.address = address
+            venue.latitude = latitude
+            venue.longitude = longitude
             venue.phone = phone
             venue.image_link = image_link
             venue.facebook_link = facebook_link
@@ -423,15 +635,7 @@ def edit_venue_submission(venue_id):
             venue.seeking_talent = seeking_talent
             venue.seeking_description = seeking_description
 
-            venue.genres.clear()
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    venue.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    venue.genres.append(new_genre)
+            venue.genres = resolve_genres(genres)
 
             db.session.commit()
         except Exception as e:
@@ -443,7 +647,7 @@ def edit_venue_submission(venue_id):
 
         if not error:
             flash('The Venue ' + name + ' has been successfully updated!')
-            return redirect(url_for('show_venue', venue_id=venue_id))
+            return redirect(url_for('main.show_venue', venue_id=venue_id))
         else:
             flash('An error has occured and update failed')
             abort(500)
@@ -453,13 +657,13 @@ def edit_venue_submission(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # get the form data
     form = ArtistForm(request.form)
@@ -477,23 +681,15 @@ def create_artist_submission():
     # check if errors in form validation
     if not form.validate():
         flash(form.errors)
-        return redirect(url_for('create_artist_submission'))
+        return redirect(url_for('main.create_artist_submission'))
     else:
         error = False
         try:
             artist = Artist(name=name, city=city, state=state, phone=phone, seeking_venue=seeking_venue,
                             seeking_description=seeking_description, image_link=image_link, website_link=website_link, facebook_link=facebook_link)
 
-            # create genres
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    artist.genres.append(fetch_genre)
-                else:
-                    # return none, create
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    artist.genres.append(new_genre)
+            # look up or create genres
+            artist.genres = resolve_genres(genres)
 
             db.session.add(artist)
             db.session.commit()
@@ -507,21 +703,20 @@ def create_artist_submission():
         if not error:
             flash('Artist ' + name +
                   ' was successfully listed!')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('An error occurred. Artist ' +
                   name + ' could not be listed.')
             abort(500)
 
 
-@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+@bp.route('/artists/<int:artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
     error = False
     try:
         artist = Artist.query.get(artist_id)
         artist_name = artist.name
-        for show in artist.shows:
-            db.session.delete(show)
+        # shows and genre links go with it through ON DELETE CASCADE
         db.session.delete(artist)
         db.session.commit()
     except:
@@ -534,7 +729,7 @@ def delete_artist(artist_id):
         flash('Artist ' + artist_name + ' was deleted')
         return jsonify({
             'deleted': True,
-            'url': url_for('artists')
+            'url': url_for('main.artists')
         })
     else:
         flash('An error occured and artist ' +
@@ -545,42 +740,139 @@ def delete_artist(artist_id):
 #  Shows
 #  ----------------------------------------------------------------
 
-# displays list of shows at /shows
-@app.route('/shows')
-def shows():
-    shows = Show.query.order_by(db.desc(Show.start_time)).all()
-    data = []
-    for show in shows:
-        data.append({
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'artist_id': show.artist_id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': format_datetime(str(show.start_time))
-        })
-    return render_template('pages/shows.html', shows=data)
+def encode_cursor(start_time, show_id):
+    return f'{start_time.isoformat()}_{show_id}'
+
+
+def decode_cursor(cursor):
+    try:
+        start_time, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
 
 
-@app.route('/shows/create', methods=['GET'])
+def parse_time(value):
+    value = datetime.fromisoformat(value)
+    # show times are stored as local times without a zone
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+# the ?from= and ?to= bounds of a request as [since, until), either None
+# when not given. Dates or datetimes in ISO format
+def time_range(default_since=None):
+    try:
+        since = parse_time(request.args['from']) if request.args.get('from') \
+            else default_since
+        until = parse_time(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        abort(400)
+    return since, until
+
+
+def starting_between(since, until):
+    conditions = []
+    if since is not None:
+        conditions.append(Show.start_time >= since)
+    if until is not None:
+        conditions.append(Show.start_time < until)
+    return conditions
+
+
+# displays list of shows at /shows, newest first, one page at a time.
+# pages are addressed by the (start_time, id) of the row next to them so
+# the database can seek straight to the page instead of counting offsets.
+# ?from= and ?to= narrow the list to shows starting in that range
+@bp.route('/shows')
+@conditional(shows_validators)
+@cache.cached('shows')
+@query_budget(1)
+def shows():
+    per_page = request.args.get(
+        'per_page', current_app.config['SHOWS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['SHOWS_MAX_PER_PAGE']))
+    after = request.args.get('after')
+    before = request.args.get('before')
+    since, until = time_range()
+
+    # venue and artist names come from the same query as the shows
+    query = db.session.query(Show.id, Show.start_time, Show.venue_id, Venue.name,
+                             Show.artist_id, Artist.name, Artist.image_link) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(*starting_between(since, until))
+    key = db.tuple_(Show.start_time, Show.id)
+
+    if before:
+        # walk back towards newer shows, then flip the page into display order
+        query = query.filter(key > decode_cursor(before)) \
+            .order_by(Show.start_time, Show.id)
+    else:
+        if after:
+            query = query.filter(key < decode_cursor(after))
+        query = query.order_by(db.desc(Show.start_time), db.desc(Show.id))
+
+    # fetch one extra row to find out whether there is another page
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    shows = ({
+        'venue_id': venue_id,
+        'venue_name': venue_name,
+        'artist_id': artist_id,
+        'artist_name': artist_name,
+        'artist_image_link': artist_image_link,
+        'start_time': start_time
+    } for _, start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link in rows)
+
+    prev_cursor = next_cursor = None
+    if rows:
+        if (has_more if before else after):
+            prev_cursor = encode_cursor(rows[0][1], rows[0][0])
+        if (before or has_more):
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    # carried over to the other pages
+    page_args = {name: request.args[name] for name in ('per_page', 'from', 'to')
+                 if request.args.get(name)}
+    return render_listing('pages/shows.html', shows=shows, prev_cursor=prev_cursor,
+                          next_cursor=next_cursor, page_args=page_args)
+
+
+@bp.route('/shows/create', methods=['GET'])
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
+    form = ShowForm(request.form)
+    if not form.validate():
+        flash(form.errors)
+        return redirect(url_for('main.create_shows'))
+
     error = False
+    booked = []
     try:
-        form = ShowForm(request.form)
         show = Show(
             artist_id=form.artist_id.data,
             venue_id=form.venue_id.data,
-            start_time=form.start_time.data
+            start_time=form.start_time.data,
+            end_time=form.start_time.data + timedelta(minutes=form.duration.data)
         )
-        db.session.add(show)
-        db.session.commit()
+        booked = [f'The {kind} is already booked from {other.start_time} to {other.end_time}.'
+                  for kind, other in bookings.book(show)]
+        if booked:
+            db.session.rollback()
+        else:
+            db.session.commit()
     except Exception as e:
         error = True
         print(f'Exception "{e}" in create show')
@@ -588,34 +880,422 @@ def create_show_submission():
     finally:
         db.session.close()
 
+    if booked:
+        for message in booked:
+            flash(message)
+        return redirect(url_for('main.create_shows'))
     if not error:
         flash('Show was successfully listed!')
-        return redirect(url_for('shows'))
+        return redirect(url_for('main.shows'))
     else:
         flash('An error occurred. Show could not be listed.')
         abort(500)
 
 
-@app.errorhandler(404)
+#  Calendars
+#  ----------------------------------------------------------------
+
+# One statement per calendar: the venue or artist row, outer joined to its
+# shows in the requested range, which the (venue_id, start_time) or
+# (artist_id, start_time) index finds with one range scan in start order.
+# A missing venue or artist returns no row at all, a venue or artist
+# without shows in the range one row without a show
+def calendar_rows(owner, owner_id):
+    owner_column, other, other_column = (Show.venue_id, Artist, Show.artist_id) \
+        if owner is Venue else (Show.artist_id, Venue, Show.venue_id)
+    since, until = time_range(
+        datetime.now() - timedelta(days=current_app.config['CALENDAR_PAST_DAYS']))
+    shows = [owner_column == owner.id, *starting_between(since, until)]
+
+    query = db.session.query(
+        owner.name.label('owner_name'), Show.id.label('show_id'), Show.start_time,
+        Show.end_time, Show.updated_at, Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+        Artist.id.label('artist_id'), Artist.name.label('artist_name')) \
+        .select_from(owner) \
+        .outerjoin(Show, db.and_(*shows)) \
+        .outerjoin(other, other.id == other_column) \
+        .filter(owner.id == owner_id) \
+        .order_by(Show.start_time, Show.id)
+    rows = iterate(query)
+    first = next(rows, None)
+    if first is None:
+        abort(404)
+    if first.show_id is None:
+        return first.owner_name, iter(())
+    return first.owner_name, chain((first,), rows)
+
+
+def calendar_json(owner, owner_id):
+    name, shows = calendar_rows(owner, owner_id)
+    return jsonify({
+        'id': owner_id,
+        'name': name,
+        'shows': [{
+            'id': show.show_id,
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'start_time': show.start_time.isoformat(),
+            'end_time': show.end_time.isoformat()
+        } for show in shows]
+    })
+
+
+def calendar_feed(owner, owner_id):
+    name, shows = calendar_rows(owner, owner_id)
+    feed = calendars.feed(f'{name} | Fyyur', shows, request.host)
+    return Response(stream_with_context(feed), mimetype='text/calendar')
+
+
+# shows of a venue or an artist as JSON, for calendar widgets. Like the
+# .ics feeds below they default to shows starting CALENDAR_PAST_DAYS ago
+# or later; ?from= and ?to= pick another range
+@bp.route('/venues/<int:venue_id>/calendar')
+@conditional(venue_calendar_validators)
+@cache.cached('venue:{venue_id}')
+@query_budget(1)
+def venue_calendar(venue_id):
+    return calendar_json(Venue, venue_id)
+
+
+@bp.route('/artists/<int:artist_id>/calendar')
+@conditional(artist_calendar_validators)
+@cache.cached('artist:{artist_id}')
+@query_budget(1)
+def artist_calendar(artist_id):
+    return calendar_json(Artist, artist_id)
+
+
+# subscribable feeds. Calendar clients poll them every few minutes: a poll
+# is answered with 304, or from the response cache, until a show of the
+# venue or artist changes, and otherwise costs the one range query
+@bp.route('/venues/<int:venue_id>/calendar.ics')
+@conditional(venue_calendar_validators)
+@cache.cached('venue:{venue_id}')
+@query_budget(1)
+def venue_calendar_feed(venue_id):
+    return calendar_feed(Venue, venue_id)
+
+
+@bp.route('/artists/<int:artist_id>/calendar.ics')
+@conditional(artist_calendar_validators)
+@cache.cached('artist:{artist_id}')
+@query_budget(1)
+def artist_calendar_feed(artist_id):
+    return calendar_feed(Artist, artist_id)
+
+
+#  Export API
+#  ----------------------------------------------------------------
+
+EXPORT_BATCH_SIZE = 1000
+
+
+# incremental sync: only rows modified at or after ?since=<iso datetime>,
+# and the ids of those deleted since, from models.deletions. Returns the
+# query of rows and that of deletions, None without ?since=
+def export_since(query, model):
+    since = request.args.get('since')
+    if not since:
+        return query.order_by(model.id), None
+    try:
+        since = datetime.fromisoformat(since)
+    except ValueError:
+        abort(400)
+    deleted = db.session.query(deletions.c.row_id, deletions.c.deleted_at) \
+        .filter(deletions.c.table_name == model.__tablename__,
+                deletions.c.deleted_at >= since) \
+        .order_by(deletions.c.id)
+    return query.filter(model.updated_at >= since).order_by(model.id), deleted
+
+
+def json_default(value):
+    return value.isoformat()
+
+
+# streams rows as JSON-Lines, or as one JSON array with ?format=json. Rows
+# are read through a server-side cursor in batches and written out batch by
+# batch, so memory stays flat whatever the size of the export. Deleted rows
+# come first as {"id": ..., "deleted": true, "deleted_at": ...}, so an id
+# SQLite hands out again after a delete is not removed once re-added
+def stream_export(queries, serialize):
+    query, deleted = queries
+    as_array = request.args.get('format') == 'json'
+    items = map(serialize, query.execution_options(stream_results=True)
+                .yield_per(EXPORT_BATCH_SIZE))
+    if deleted is not None:
+        items = chain(({'id': id, 'deleted': True, 'deleted_at': deleted_at}
+                       for id, deleted_at in deleted.yield_per(EXPORT_BATCH_SIZE)), items)
+
+    def generate():
+        batch = []
+        first = True
+        if as_array:
+            yield '['
+        for item in items:
+            line = json.dumps(item, default=json_default)
+            if as_array:
+                line = line if first else ',' + line
+                first = False
+            else:
+                line += '\n'
+            batch.append(line)
+            if len(batch) == EXPORT_BATCH_SIZE:
+                yield ''.join(batch)
+                batch = []
+        yield ''.join(batch)
+        if as_array:
+            yield ']'
+
+    mimetype = 'application/json' if as_array else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@bp.route('/api/venues')
+def export_venues():
+    query = Venue.query.options(db.selectinload(Venue.genres))
+    return stream_export(export_since(query, Venue), lambda venue: {
+        'id': venue.id,
+        'name': venue.name,
+        'genres': [genre.name for genre in venue.genres],
+        'address': venue.address,
+        'city': venue.city,
+        'state': venue.state,
+        'latitude': venue.latitude,
+        'longitude': venue.longitude,
+        'phone': venue.phone,
+        'website': venue.website_link,
+        'facebook_link': venue.facebook_link,
+        'seeking_talent': venue.seeking_talent,
+        'seeking_description': venue.seeking_description,
+        'image_link': venue.image_link,
+        'updated_at': venue.updated_at
+    })
+
+
+@bp.route('/api/artists')
+def export_artists():
+    query = Artist.query.options(db.selectinload(Artist.genres))
+    return stream_export(export_since(query, Artist), lambda artist: {
+        'id': artist.id,
+        'name': artist.name,
+        'genres': [genre.name for genre in artist.genres],
+        'city': artist.city,
+        'state': artist.state,
+        'latitude': artist.latitude,
+        'longitude': artist.longitude,
+        'phone': artist.phone,
+        'website': artist.website_link,
+        'facebook_link': artist.facebook_link,
+        'seeking_venue': artist.seeking_venue,
+        'seeking_description': artist.seeking_description,
+        'image_link': artist.image_link,
+        'updated_at': artist.updated_at
+    })
+
+
+@bp.route('/api/shows')
+def export_shows():
+    query = db.session.query(Show.id, Show.venue_id, Show.artist_id,
+                             Show.start_time, Show.end_time, Show.updated_at)
+    return stream_export(export_since(query, Show), lambda show: {
+        'id': show.id,
+        'venue_id': show.venue_id,
+        'artist_id': show.artist_id,
+        'start_time': show.start_time,
+        'end_time': show.end_time,
+        'updated_at': show.updated_at
+    })
+
+
+def complete_from_database(model, prefix, limit):
+    # the prefix index is not built yet; match the start of the name only,
+    # a seek on ix_Venue_lower_name / ix_Artist_lower_name on PostgreSQL
+    return db.session.query(model.upcoming_shows_count, model.name, model.id) \
+        .filter(db.func.lower(model.name).startswith(prefix.lower(), autoescape=True)) \
+        .order_by(model.upcoming_shows_count.desc(), model.name, model.id) \
+        .limit(limit).all()
+
+
+# typeahead: venue and artist names with a word starting with ?q=, most
+# upcoming shows first, answered from memory without touching the database
+@bp.route('/api/autocomplete')
+@query_budget(2)
+def autocomplete():
+    prefix = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int),
+                search_index.MAX_COMPLETIONS)
+    if not prefix or limit < 1:
+        return jsonify([])
+
+    completions = []
+    for kind, index, model in (('venue', venue_prefixes, Venue),
+                               ('artist', artist_prefixes, Artist)):
+        matches = index.complete(prefix, limit)
+        if matches is None:
+            matches = complete_from_database(model, prefix, limit)
+        completions.extend((-upcoming, name.casefold(), kind, id, name)
+                           for upcoming, name, id in matches)
+    completions.sort()
+    return jsonify([{'type': kind, 'id': id, 'name': name, 'upcoming_shows': -upcoming}
+                    for upcoming, _, kind, id, name in completions[:limit]])
+
+
+# hit/miss counters of the response cache, per endpoint
+@bp.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats)
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+IMPORTERS = {
+    'venues': 'import_venues',
+    'artists': 'import_artists',
+    'shows': 'import_shows',
+}
+
+
+@bp.cli.command('import')
+@click.argument('kind', type=click.Choice(list(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, help='Rows written per statement and commit.')
+def import_command(kind, path, batch_size):
+    """Bulk load venues, artists or shows from a CSV or JSON-Lines file."""
+    # only the command needs the importer, so web workers never load it
+    import importer
+    import_rows = getattr(importer, IMPORTERS[kind])
+    stats = import_rows(path, batch_size or current_app.config['IMPORT_BATCH_SIZE'])
+    click.echo(str(stats))
+
+
+@bp.cli.command('refresh-counters')
+@click.option('--full', is_flag=True, help='Recount every venue and artist.')
+def refresh_counters_command(full):
+    """Move shows that have started since the last run to the past counts."""
+    since, now = counters.refresh(full)
+    click.echo(f'Show counters refreshed for shows started between {since} and {now}')
+
+
+@bp.cli.command('show-conflicts')
+def show_conflicts_command():
+    """List overlapping shows of the same venue or artist."""
+    count = 0
+    for kind, owner_id, earlier, later in bookings.show_conflicts():
+        count += 1
+        click.echo(f'{kind} {owner_id}: show {earlier.id} ({earlier.start_time} - '
+                   f'{earlier.end_time}) overlaps show {later.id} '
+                   f'({later.start_time} - {later.end_time})')
+    click.echo(f'{count} conflicts')
+    if count:
+        raise SystemExit(1)
+
+
+@bp.cli.command('matches')
+@click.option('--full', is_flag=True,
+              help='Rescore every seeking venue and artist, counting recent shows.')
+@click.option('--workers', type=int, help='Scoring processes, one per core by default.')
+def matches_command(full, workers):
+    """Store the best matches of seeking venues and artists."""
+    # only the command needs NumPy and SciPy, so web workers never load them
+    import matchmaking
+    rescored, full = matchmaking.refresh(current_app.config['MATCHES_PER_ENTITY'],
+                                         workers or current_app.config['MATCH_WORKERS'], full)
+    click.echo(f"{'Full' if full else 'Incremental'} run: {rescored['artist']} artists "
+               f"and {rescored['venue']} venues rescored")
+
+
+@bp.cli.command('geocode')
+@click.argument('gazetteer', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--all', 'overwrite', is_flag=True,
+              help='Locate venues and artists that already have coordinates too.')
+@click.option('--batch-size', type=int, help='Rows written per statement and commit.')
+def geocode_command(gazetteer, overwrite, batch_size):
+    """Set venue and artist coordinates from a local gazetteer file."""
+    if gazetteer:
+        locate = geo.Gazetteer(gazetteer).locate
+    elif current_app.config['GEOCODER']:
+        locate = current_app.config['GEOCODER']
+    else:
+        raise click.UsageError('Give a gazetteer file or set GEOCODER.')
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    for name, model in (('venues', Venue), ('artists', Artist)):
+        located, missed = geo.geocode(model, locate, batch_size, overwrite)
+        click.echo(f'{located} {name} located, {missed} not found')
+
+
+@bp.cli.command('assets')
+def assets_command():
+    """Build the minified, fingerprinted and precompressed static bundles."""
+    for name, (hashed, files) in assets.build(current_app.static_folder).items():
+        sizes = ', '.join(f'{os.path.basename(path)} {size:,} B' for path, size in files)
+        click.echo(f'{name}: {sizes}')
+    click.echo('Restart the app to serve the new bundles.')
+
+#----------------------------------------------------------------------------#
+# Application factory.
+#----------------------------------------------------------------------------#
+
+
+def configure_logging(app):
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+
+# builds a configured app. Importing this module creates no app, engine or
+# thread; `flask` finds this factory through FLASK_APP=app and gunicorn
+# calls it once in the master when preloading (see gunicorn.conf.py)
+def create_app(config_object='config'):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    load_secret_key(app)
+
+    db.init_app(app)
+    if app.config['MIGRATIONS_ENABLED']:
+        # alembic is a third of the startup time and only `flask db` needs it
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    init_replica_routing(app)
+    init_instrumentation(app)
+    cache.init_app(app)
+    assets.init_assets(app)
+
+    app.jinja_env.filters['datetime'] = lru_cache(
+        maxsize=app.config['DATETIME_FORMAT_CACHE_SIZE'])(format_datetime)
+    app.register_blueprint(bp)
+    configure_logging(app)
+
+    if app.config['SEARCH_INDEX_ENABLED']:
+        sync = search_index.IndexSync(app, db, index_changes, SEARCH_INDEXES)
+        if app.config['SEARCH_INDEX_BACKGROUND']:
+            sync.rebuild()
+        else:
+            sync.build()
+        app.before_request(sync.check)
+    return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -623,11 +1303,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,180 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from flask import abort, current_app, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#
+# `flask assets` concatenates and minifies the stylesheets and scripts
+# layouts/main.html loads into one file per bundle, named after a hash of
+# its content, next to .gz and .br copies, and records the names in
+# static/dist/manifest.json. The asset_urls() template helper links the
+# bundles once they are built and the source files before that, or with
+# ASSETS_DEBUG so edits show up without a rebuild.
+#
+# Bundles are served with far-future immutable caching, since a changed
+# file gets a new name, and precompressed for clients that accept it.
+# Brotli copies need the brotli package and scripts are minified with
+# rjsmin, both in requirements.txt; without them the build still runs,
+# writing gzip copies only and concatenating scripts unminified (most of
+# them already ship minified).
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, so it runs after jQuery at the end of the body
+    'main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# bundles are written one directory below static/ like the sources in
+# css/ and js/, so relative url()s such as ../fonts/ keep resolving
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_STRINGS = re.compile(r'''("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')''')
+CSS_COMMENTS = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+# not around ':', which in a selector separates '.a :hover' from '.a:hover'
+CSS_PUNCTUATION_SPACE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    # strings are split out first so nothing inside them is touched
+    parts = CSS_STRINGS.split(CSS_COMMENTS.sub('', css))
+    for i in range(0, len(parts), 2):
+        part = CSS_SPACE.sub(' ', parts[i])
+        part = CSS_PUNCTUATION_SPACE.sub(r'\1', part)
+        parts[i] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(js):
+    return rjsmin.jsmin(js) if rjsmin is not None else js
+
+
+def bundle(static_folder, name):
+    sources = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            sources.append(f.read())
+    if name.endswith('.css'):
+        return '\n'.join(minify_css(source) for source in sources)
+    # a script without a trailing semicolon must not run into the next one
+    return '\n;'.join(minify_js(source) for source in sources)
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+# returns {bundle: (hashed name, [(path, size)])}
+def build(static_folder):
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    built = {}
+    for name in BUNDLES:
+        data = bundle(static_folder, name).encode('utf-8')
+        stem, extension = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        path = os.path.join(dist, hashed)
+        write(path, data)
+        # mtime=0 keeps the .gz byte for byte the same across builds
+        write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        files = [path, path + '.gz']
+        if brotli is not None:
+            write(path + '.br', brotli.compress(data, quality=11))
+            files.append(path + '.br')
+        manifest[name] = f'{DIST}/{hashed}'
+        built[name] = (hashed, [(path, os.path.getsize(path)) for path in files])
+
+    # written last, so a running build never points at missing files
+    temp = os.path.join(dist, MANIFEST + '.tmp')
+    with open(temp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp, os.path.join(dist, MANIFEST))
+    return built
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(app.static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+
+def asset_urls(name):
+    manifest = current_app.extensions['assets']
+    if name in manifest and not current_app.config['ASSETS_DEBUG']:
+        return [url_for('static', filename=manifest[name])]
+    return [url_for('static', filename=path) for path in BUNDLES[name]]
+
+
+def send_bundle(filename):
+    dist = os.path.join(current_app.static_folder, DIST)
+    path = os.path.join(dist, filename)
+    if os.path.dirname(os.path.normpath(path)) != dist or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    # the type of the bundle, not of its .gz or .br copy
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+    response = send_file(path, mimetype=mimetype, max_age=MAX_AGE, conditional=True)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.extensions['assets'] = load_manifest(app)
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    # more specific than the /static/<path:filename> rule, so it wins
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<filename>',
+                     'assets', send_bundle)
@@ -0,0 +1,202 @@
+#----------------------------------------------------------------------------#
+# Seeds a synthetic catalog for benchmarks.
+#
+#   python benchmarks/catalog.py --database-url sqlite:////tmp/fyyur.db \
+#       --venues 1000 --artists 2000 --shows 50000 [--seed 0]
+#
+# Cities, genres, venues and artists are drawn from Zipf-like distributions,
+# so a few cities hold most venues, a few genres most entities, and popular
+# venues and artists host most shows, like a real catalog. The same seed
+# always produces the same catalog. Point it at a scratch database: the
+# tables are created if missing and rows are added to whatever is there.
+# No two shows of a venue or an artist overlap.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config  # noqa: E402
+
+CITIES = [
+    ('New York', 'NY', 40.71, -74.01), ('Los Angeles', 'CA', 34.05, -118.24),
+    ('San Francisco', 'CA', 37.77, -122.42), ('Chicago', 'IL', 41.88, -87.63),
+    ('Austin', 'TX', 30.27, -97.74), ('Nashville', 'TN', 36.16, -86.78),
+    ('Seattle', 'WA', 47.61, -122.33), ('New Orleans', 'LA', 29.95, -90.07),
+    ('Boston', 'MA', 42.36, -71.06), ('Atlanta', 'GA', 33.75, -84.39),
+    ('Denver', 'CO', 39.74, -104.99), ('Portland', 'OR', 45.52, -122.68),
+    ('Philadelphia', 'PA', 39.95, -75.17), ('Miami', 'FL', 25.76, -80.19),
+    ('Detroit', 'MI', 42.33, -83.05), ('Minneapolis', 'MN', 44.98, -93.27),
+    ('Houston', 'TX', 29.76, -95.37), ('Phoenix', 'AZ', 33.45, -112.07),
+    ('Oakland', 'CA', 37.80, -122.27), ('Brooklyn', 'NY', 40.68, -73.94),
+    ('Memphis', 'TN', 35.15, -90.05), ('Baltimore', 'MD', 39.29, -76.61),
+    ('Pittsburgh', 'PA', 40.44, -80.00), ('Cleveland', 'OH', 41.50, -81.69),
+    ('Kansas City', 'MO', 39.10, -94.58), ('Salt Lake City', 'UT', 40.76, -111.89),
+    ('Richmond', 'VA', 37.54, -77.44), ('Louisville', 'KY', 38.25, -85.76),
+    ('Albuquerque', 'NM', 35.08, -106.65), ('Boise', 'ID', 43.62, -116.21),
+]
+# venues are scattered this many degrees around their city's center;
+# artists are placed at the center
+SPREAD_DEGREES = 0.15
+GENRES = ['Rock n Roll', 'Pop', 'Jazz', 'Hip-Hop', 'Electronic', 'Alternative',
+          'Folk', 'Blues', 'R&B', 'Country', 'Soul', 'Punk', 'Heavy Metal',
+          'Classical', 'Funk', 'Reggae', 'Instrumental', 'Musical Theatre', 'Other']
+WORDS = ['Blue', 'Velvet', 'Echo', 'Neon', 'Golden', 'Wild', 'Silver', 'Electric',
+         'Midnight', 'Lucky', 'Iron', 'Crimson', 'Paper', 'Hollow', 'Northern',
+         'Copper', 'Lonely', 'Static', 'Broken', 'Little']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Club', 'Theatre', 'Stage', 'Bar']
+ARTIST_NOUNS = ['Owls', 'Tigers', 'Hearts', 'Machines', 'Rivers', 'Ghosts',
+                'Kings', 'Sisters', 'Brothers', 'Collective', 'Trio', 'Band']
+
+BATCH_SIZE = 5000
+# attempts at finding a free slot for a show
+MAX_DRAWS = 20
+
+
+def zipf_weights(n, s=1.1):
+    # cumulative, so rng.choices does not re-add them on every draw
+    return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def entity_name(rng, nouns, i):
+    # ids keep names, and so natural keys, unique
+    return f'The {rng.choice(WORDS)} {rng.choice(nouns)} {i}'
+
+
+def draw_genres(rng, weights):
+    count = rng.choices((1, 2, 3), cum_weights=(6, 9, 10))[0]
+    return sorted(set(rng.choices(GENRES, cum_weights=weights, k=count)))
+
+
+def generate_entities(rng, count, nouns, spread, extra):
+    city_weights = zipf_weights(len(CITIES))
+    genre_weights = zipf_weights(len(GENRES))
+    for i in range(count):
+        city, state, lat, lng = rng.choices(CITIES, cum_weights=city_weights)[0]
+        row = {
+            'name': entity_name(rng, nouns, i),
+            'city': city,
+            'state': state,
+            'latitude': round(lat + rng.uniform(-spread, spread), 6),
+            'longitude': round(lng + rng.uniform(-spread, spread), 6),
+            'phone': f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}',
+            'image_link': f'https://images.example.com/{nouns[0].lower()}/{i}.jpg',
+            'facebook_link': None,
+            'website_link': None,
+            'seeking_description': None,
+        }
+        row.update(extra(rng, i))
+        yield row, draw_genres(rng, genre_weights)
+
+
+def insert_entities(db, model, association, owner_column, entities, genre_ids):
+    ids = []
+    rows = list(entities)
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        last_id = db.session.query(db.func.max(model.id)).scalar() or 0
+        db.session.execute(model.__table__.insert(), [row for row, _ in batch])
+        names = [row['name'] for row, _ in batch]
+        by_name = dict(db.session.query(model.name, model.id).filter(model.id > last_id))
+        links = [{owner_column: by_name[row['name']], 'genre_id': genre_ids[name]}
+                 for row, genres in batch for name in genres]
+        db.session.execute(association.insert(), links)
+        ids.extend(by_name[name] for name in names)
+    return ids
+
+
+def generate_shows(rng, count, venue_ids, artist_ids, now):
+    venue_weights = zipf_weights(len(venue_ids), 0.8)
+    artist_weights = zipf_weights(len(artist_ids), 0.8)
+    # start times are two hours apart, as long as the default duration, so
+    # shows only overlap if they share one; taken slots are drawn again, and
+    # the rare show that keeps hitting them is left out
+    booked = set()
+    for _ in range(count):
+        for _ in range(MAX_DRAWS):
+            # a year either side of now, denser close to today
+            days = rng.triangular(-365, 365, 0)
+            start_time = now + timedelta(days=int(days), hours=rng.choice((18, 20, 22)))
+            venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+            artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+            slots = (('venue', venue_id, start_time), ('artist', artist_id, start_time))
+            if not booked.intersection(slots):
+                break
+        else:
+            continue
+        booked.update(slots)
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'updated_at': datetime.utcnow(),
+        }
+
+
+# seeds venues, artists and shows inside an app context and returns the ids
+# of the new venues and artists, most popular first
+def seed(db, venues, artists, shows, seed=0):
+    import counters
+    from genres import resolve_genre_ids
+    from models import Venue, Artist, Show, venue_genres, artist_genres
+
+    rng = random.Random(seed)
+    genre_ids = resolve_genre_ids(GENRES)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    venue_ids = insert_entities(
+        db, Venue, venue_genres, 'venue_id',
+        generate_entities(rng, venues, VENUE_NOUNS, SPREAD_DEGREES, lambda rng, i: {
+            'address': f'{rng.randint(1, 9999)} {rng.choice(WORDS)} St',
+            'seeking_talent': rng.random() < 0.3,
+        }), genre_ids)
+    artist_ids = insert_entities(
+        db, Artist, artist_genres, 'artist_id',
+        generate_entities(rng, artists, ARTIST_NOUNS, 0, lambda rng, i: {
+            'seeking_venue': rng.random() < 0.3,
+        }), genre_ids)
+
+    rows = list(generate_shows(rng, shows, venue_ids, artist_ids, now)) \
+        if venue_ids and artist_ids else []
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(Show.__table__.insert(), rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+    # Core inserts skip the ORM events that maintain the show counters
+    counters.refresh(full=True)
+    return venue_ids, artist_ids
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed a synthetic catalog.')
+    parser.add_argument('--database-url', default=config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config.SQLALCHEMY_DATABASE_URI = args.database_url
+    config.SEARCH_INDEX_ENABLED = False
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        seed(db, args.venues, args.artists, args.shows, args.seed)
+    print(f'seeded {args.venues} venues, {args.artists} artists and '
+          f'{args.shows} shows into {args.database_url}')
+
+
+if __name__ == '__main__':
+    main()
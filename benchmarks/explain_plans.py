@@ -0,0 +1,137 @@
+#----------------------------------------------------------------------------#
+# Prints the query plans of every read route, without and with the indexes
+# declared on the models.
+#
+#   python benchmarks/explain_plans.py [--database-url URL]
+#
+# The indexes are dropped and recreated inside a transaction that is rolled
+# back, so the database is left untouched. SQLite does not run DDL inside
+# the transaction, so SQLite databases are explained on a temporary copy.
+# Point it at a development database: on PostgreSQL the transaction holds
+# exclusive locks on the indexed tables while it runs.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config  # noqa: E402
+
+# statements the write handlers run that no read route exercises
+EXTRA_STATEMENTS = [
+    ('genre lookup', 'SELECT id FROM "Genre" WHERE name = :name', {'name': 'Jazz'}),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Print query plans of the read routes without and with indexes.')
+    parser.add_argument('--database-url', default=config.SQLALCHEMY_DATABASE_URI)
+    return parser.parse_args()
+
+
+def sqlite_copy(url):
+    path = url[len('sqlite:///'):]
+    fd, copy = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    shutil.copyfile(path, copy)
+    return 'sqlite:///' + copy
+
+
+def capture_route_statements(app, db, client):
+    from models import Artist, Venue
+
+    with app.app_context():
+        venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+        artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+        db.session.remove()
+
+    routes = ['/venues', '/artists', '/shows']
+    if venue_id is not None:
+        routes.append(f'/venues/{venue_id}')
+    if artist_id is not None:
+        routes.append(f'/artists/{artist_id}')
+
+    captured = []
+    current = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((current['route'], statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for route in routes:
+            current['route'] = route
+            client.get(route)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return captured
+
+
+def explain(conn, statement, parameters, driver_sql=True):
+    sqlite = conn.dialect.name == 'sqlite'
+    statement = ('EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN ') + statement
+    if driver_sql:
+        rows = conn.exec_driver_sql(statement, parameters)
+    else:
+        rows = conn.execute(text(statement), parameters)
+    return [str(row[-1] if sqlite else row[0]) for row in rows]
+
+
+def print_plans(conn, title, captured):
+    print(f'===== {title} =====')
+    plans = [(route, statement, explain(conn, statement, parameters))
+             for route, statement, parameters in captured]
+    plans += [(name, statement, explain(conn, statement, parameters, driver_sql=False))
+              for name, statement, parameters in EXTRA_STATEMENTS]
+    for name, statement, plan in plans:
+        print(f'--- {name}')
+        print(statement.strip())
+        for line in plan:
+            print('    ' + line)
+    print()
+
+
+def main():
+    args = parse_args()
+    url = args.database_url
+    if url.startswith('sqlite:///'):
+        url = sqlite_copy(url)
+    config.SQLALCHEMY_DATABASE_URI = url
+    config.SEARCH_INDEX_ENABLED = False
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+
+    captured = capture_route_statements(app, db, app.test_client())
+    indexes = [index for table in db.metadata.sorted_tables
+               for index in table.indexes]
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                for index in indexes:
+                    index.drop(conn, checkfirst=True)
+                print_plans(conn, 'before (no secondary indexes)', captured)
+                for index in indexes:
+                    index.create(conn)
+                print_plans(conn, 'after', captured)
+            finally:
+                trans.rollback()
+
+    if url != args.database_url:
+        os.remove(url[len('sqlite:///'):])
+
+
+if __name__ == '__main__':
+    main()
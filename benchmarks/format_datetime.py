@@ -0,0 +1,64 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmark for the datetime filter on a 10k-show page.
+#
+#   python benchmarks/format_datetime.py
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import timeit
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import format_datetime as uncached_format_datetime  # noqa: E402
+
+# memoized the way create_app() registers the filter
+format_datetime = lru_cache(maxsize=16384)(uncached_format_datetime)
+
+ROWS = 10000
+REPEAT = 5
+
+
+# the previous pipeline: the view formats a str() of the timestamp and the
+# template parses and formats that string again with the 'full' pattern
+def old_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def old_page(start_times):
+    for start_time in start_times:
+        old_format_datetime(old_format_datetime(str(start_time)), 'full')
+
+
+def new_page(start_times):
+    for start_time in start_times:
+        format_datetime(start_time, 'full')
+
+
+def report(name, seconds):
+    print(f'{name:<24} {seconds * 1000:9.2f} ms/page {seconds / ROWS * 1e6:8.2f} us/row')
+
+
+if __name__ == '__main__':
+    # shows are mostly booked on the hour, so timestamps repeat across a page
+    base = datetime(2022, 6, 1, 20)
+    start_times = [base + timedelta(hours=i % 2000) for i in range(ROWS)]
+
+    report('old (parse + format x2)', min(timeit.repeat(
+        lambda: old_page(start_times), number=1, repeat=REPEAT)))
+
+    format_datetime.cache_clear()
+    report('new (cold cache)', timeit.timeit(
+        lambda: new_page(start_times), number=1))
+    report('new (warm cache)', min(timeit.repeat(
+        lambda: new_page(start_times), number=1, repeat=REPEAT)))
+    print(format_datetime.cache_info())
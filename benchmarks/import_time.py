@@ -0,0 +1,81 @@
+#----------------------------------------------------------------------------#
+# Startup time budget: how long a fresh process takes to import app.py and
+# run create_app(), the way a gunicorn master starts.
+#
+#   python benchmarks/import_time.py [--budget-ms 600] [--repeat 5] [--top 15]
+#
+# Runs each measurement in a new interpreter with -X importtime and prints
+# the modules that cost the most to import. The exit status is 1 when the
+# fastest run is over --budget-ms.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'create_app_ms': (created - imported) * 1000}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Check the startup time budget.')
+    parser.add_argument('--budget-ms', type=float, default=600)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    return parser.parse_args()
+
+
+def run_probe():
+    env = dict(os.environ,
+               # as gunicorn.conf.py starts workers; the index build and the
+               # database are not part of the budget
+               MIGRATIONS_ENABLED='0', SEARCH_INDEX_BACKGROUND='1',
+               DATABASE_URL='sqlite://', REQUEST_LOG='', SLOW_QUERY_LOG='')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime_log, top):
+    # lines look like 'import time:  self [us] | cumulative | package'
+    modules = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(own), int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    args = parse_args()
+    runs = [run_probe() for _ in range(args.repeat)]
+    timings, log = min(runs, key=lambda run: sum(run[0].values()))
+    total = sum(timings.values())
+
+    print(f'{"self ms":>8} {"cumulative ms":>14}  module')
+    for own, cumulative, name in slowest_modules(log, args.top):
+        print(f'{own / 1000:>8.1f} {cumulative / 1000:>14.1f}  {name}')
+    print(f'\nimport app {timings["import_ms"]:.0f} ms, create_app() '
+          f'{timings["create_app_ms"]:.0f} ms, total {total:.0f} ms '
+          f'(budget {args.budget_ms:.0f} ms, best of {args.repeat})')
+
+    if total > args.budget_ms:
+        print('OVER BUDGET')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Time of `flask matches`, full and incremental, as the catalog grows.
+#
+#   python benchmarks/matchmaking.py [--sizes 1000,10000,50000]
+#       [--workers 1,4] [--changes 50] [--seed 0]
+#
+# For each size a catalog of that many venues and twice as many artists
+# (see catalog.py) is seeded into a temporary SQLite database. A full run
+# is timed with each number of worker processes, then --changes seeking
+# artists get new genres and an incremental run is timed.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config  # noqa: E402
+
+MATCHES_PER_ENTITY = 6
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Time the matchmaking refresh.')
+    parser.add_argument('--sizes', default='1000,10000,50000',
+                        help='comma separated venue counts')
+    parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}',
+                        help='comma separated process counts')
+    parser.add_argument('--changes', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def seed(size, seed_value):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    url = 'sqlite:///' + path
+    subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.py'),
+         '--database-url', url, '--venues', str(size), '--artists', str(size * 2),
+         '--shows', str(size * 5), '--seed', str(seed_value)],
+        capture_output=True, check=True)
+    return path, url
+
+
+def timed(refresh, workers, full):
+    started = time.perf_counter()
+    rescored, full = refresh(MATCHES_PER_ENTITY, workers, full)
+    return time.perf_counter() - started, rescored, full
+
+
+def main():
+    args = parse_args()
+    config.SEARCH_INDEX_ENABLED = False
+    config.MIGRATIONS_ENABLED = False
+    config.REQUEST_LOG = None
+    config.SLOW_QUERY_LOG = None
+
+    print(f'{"venues":>7} {"run":<12} {"workers":>7} {"seconds":>8} '
+          f'{"artists":>8} {"venues":>8}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        path, url = seed(size, args.seed)
+        config.SQLALCHEMY_DATABASE_URI = url
+        try:
+            from app import create_app
+            import genres
+            from genres import resolve_genres
+            import matchmaking
+            from models import db, Artist
+
+            app = create_app()
+            # genre ids are cached per process, and each size is a new database
+            genres.genre_ids.clear()
+            with app.app_context():
+                for workers in [int(workers) for workers in args.workers.split(',')]:
+                    seconds, rescored, _ = timed(matchmaking.refresh, workers, True)
+                    print(f'{size:>7} {"full":<12} {workers:>7} {seconds:>8.2f} '
+                          f'{rescored["artist"]:>8} {rescored["venue"]:>8}')
+
+                rng = random.Random(args.seed)
+                artists = Artist.query.filter(Artist.seeking_venue.is_(True)).all()
+                for artist in rng.sample(artists, min(args.changes, len(artists))):
+                    artist.genres = resolve_genres(rng.sample(['Jazz', 'Folk', 'Soul', 'Punk'], 2))
+                db.session.commit()
+                seconds, rescored, full = timed(matchmaking.refresh, workers, False)
+                run = 'full (auto)' if full else 'incremental'
+                print(f'{size:>7} {run:<12} {workers:>7} {seconds:>8.2f} '
+                      f'{rescored["artist"]:>8} {rescored["venue"]:>8}')
+                db.session.remove()
+                db.engine.dispose()
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
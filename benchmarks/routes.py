@@ -0,0 +1,340 @@
+#----------------------------------------------------------------------------#
+# Latency and query counts of every route, on a synthetic catalog.
+#
+#   python benchmarks/routes.py [--venues N --artists M --shows K --seed S]
+#       [--requests 50] [--database-url URL] [--output results.json]
+#       [--compare baseline.json] [--threshold 1.25] [--cache]
+#
+# Seeds a catalog (see catalog.py) into a temporary SQLite database, or into
+# --database-url, which must point at an empty scratch database. Each route
+# is requested through the Flask test client and the p50/p99 latency and
+# number of statements are written as JSON to --output (by default
+# benchmarks/results/<timestamp>.json). With --compare, routes slower than
+# --threshold times the baseline, or running more statements, are listed and
+# the exit status is 1, as it is without a baseline to compare with; p99 is
+# only compared from 100 requests per route on. Compare runs of the same
+# catalog on the same machine.
+#
+# The response cache is off unless --cache is given, so pages are rendered
+# on every request. Streamed responses are read to the end.
+#----------------------------------------------------------------------------#
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config  # noqa: E402
+import catalog  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+WARMUP = 3
+# differences below this are noise on any machine
+NOISE_MS = 1.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark every route of the app.')
+    parser.add_argument('--database-url')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='timed requests per route')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', metavar='BASELINE')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the response cache enabled')
+    return parser.parse_args()
+
+#----------------------------------------------------------------------------#
+# Routes.
+#
+# Each case is (name, url rule, method, request builder). A builder returns
+# the path and request arguments for one request; write routes get fresh
+# rows from their builder so every request does the same work.
+#----------------------------------------------------------------------------#
+
+
+def venue_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+            'phone': '415-555-0100', 'genres': ['Jazz', 'Blues'],
+            'image_link': 'https://images.example.com/venue.jpg', 'facebook_link': '',
+            'website_link': '', 'seeking_talent': 'y', 'seeking_description': ''}
+
+
+def artist_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0100',
+            'genres': ['Jazz', 'Blues'], 'image_link': 'https://images.example.com/artist.jpg',
+            'facebook_link': '', 'website_link': '', 'seeking_venue': 'y',
+            'seeking_description': ''}
+
+
+def build_cases(app, db, venue_ids, artist_ids):
+    from models import Venue, Artist
+
+    top_venue, top_artist = venue_ids[0], artist_ids[0]
+    median_venue = venue_ids[len(venue_ids) // 2]
+    median_artist = artist_ids[len(artist_ids) // 2]
+    counter = iter(range(10 ** 9))
+    today = datetime.now().date()
+    next_week = today + timedelta(days=7)
+
+    def get(path):
+        return lambda: (path, {})
+
+    def post(path, data):
+        return lambda: (path, {'data': data() if callable(data) else data})
+
+    def new_row(model, form):
+        def build():
+            row = model(**{key: value for key, value in form(f'Doomed {next(counter)}').items()
+                           if key not in ('genres', 'seeking_talent', 'seeking_venue')})
+            with app.app_context():
+                db.session.add(row)
+                db.session.commit()
+                id = row.id
+                db.session.remove()
+            return id
+        return build
+
+    new_venue = new_row(Venue, venue_form)
+    new_artist = new_row(Artist, artist_form)
+    # a free slot every time, past the seeded shows, so each request books
+    def show_form():
+        start_time = datetime(2030, 1, 1, 20) + timedelta(hours=3 * next(counter))
+        return {'venue_id': top_venue, 'artist_id': top_artist,
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'duration': 120}
+
+    return [
+        ('index', '/', 'GET', get('/')),
+        ('venues', '/venues', 'GET', get('/venues')),
+        ('venues (genre, city)', '/venues', 'GET', get('/venues?genre=Jazz&city=New+York')),
+        ('venues nearby', '/venues/nearby', 'GET',
+         get('/venues/nearby?lat=40.71&lng=-74.01&radius=25')),
+        ('search venues', '/venues/search', 'POST',
+         post('/venues/search', {'search_term': 'blue'})),
+        ('venue (busiest)', '/venues/<int:venue_id>', 'GET', get(f'/venues/{top_venue}')),
+        ('venue (median)', '/venues/<int:venue_id>', 'GET', get(f'/venues/{median_venue}')),
+        ('create venue form', '/venues/create', 'GET', get('/venues/create')),
+        ('create venue', '/venues/create', 'POST',
+         post('/venues/create', lambda: venue_form(f'Bench Venue {next(counter)}'))),
+        ('edit venue form', '/venues/<int:venue_id>/edit', 'GET',
+         get(f'/venues/{median_venue}/edit')),
+        ('edit venue', '/venues/<int:venue_id>/edit', 'POST',
+         post(f'/venues/{median_venue}/edit', lambda: venue_form(f'Edited {next(counter)}'))),
+        ('delete venue', '/venues/<venue_id>', 'DELETE',
+         lambda: (f'/venues/{new_venue()}', {})),
+        ('artists', '/artists', 'GET', get('/artists')),
+        ('artists (2 genres)', '/artists', 'GET', get('/artists?genre=Rock+n+Roll&genre=Pop')),
+        ('search artists', '/artists/search', 'POST',
+         post('/artists/search', {'search_term': 'owl'})),
+        ('artist (busiest)', '/artists/<int:artist_id>', 'GET', get(f'/artists/{top_artist}')),
+        ('artist (median)', '/artists/<int:artist_id>', 'GET',
+         get(f'/artists/{median_artist}')),
+        ('artist venues nearby', '/artists/<int:artist_id>/venues/nearby', 'GET',
+         get(f'/artists/{median_artist}/venues/nearby')),
+        ('create artist form', '/artists/create', 'GET', get('/artists/create')),
+        ('create artist', '/artists/create', 'POST',
+         post('/artists/create', lambda: artist_form(f'Bench Artist {next(counter)}'))),
+        ('edit artist form', '/artists/<int:artist_id>/edit', 'GET',
+         get(f'/artists/{median_artist}/edit')),
+        ('edit artist', '/artists/<int:artist_id>/edit', 'POST',
+         post(f'/artists/{median_artist}/edit', lambda: artist_form(f'Edited {next(counter)}'))),
+        ('delete artist', '/artists/<int:artist_id>', 'DELETE',
+         lambda: (f'/artists/{new_artist()}', {})),
+        ('shows', '/shows', 'GET', get('/shows')),
+        ('shows (100 per page)', '/shows', 'GET', get('/shows?per_page=100')),
+        ('shows (next week)', '/shows', 'GET', get(f'/shows?from={today}&to={next_week}')),
+        ('venue calendar', '/venues/<int:venue_id>/calendar', 'GET',
+         get(f'/venues/{top_venue}/calendar')),
+        ('artist calendar', '/artists/<int:artist_id>/calendar', 'GET',
+         get(f'/artists/{top_artist}/calendar')),
+        ('venue feed', '/venues/<int:venue_id>/calendar.ics', 'GET',
+         get(f'/venues/{top_venue}/calendar.ics')),
+        ('artist feed (all)', '/artists/<int:artist_id>/calendar.ics', 'GET',
+         get(f'/artists/{top_artist}/calendar.ics?from=2000-01-01')),
+        ('create show form', '/shows/create', 'GET', get('/shows/create')),
+        ('create show', '/shows/create', 'POST', post('/shows/create', show_form)),
+        ('export venues', '/api/venues', 'GET', get('/api/venues')),
+        ('export artists', '/api/artists', 'GET', get('/api/artists')),
+        ('export shows', '/api/shows', 'GET', get('/api/shows')),
+        ('autocomplete (1 letter)', '/api/autocomplete', 'GET', get('/api/autocomplete?q=b')),
+        ('autocomplete (word)', '/api/autocomplete', 'GET', get('/api/autocomplete?q=blue ow')),
+        ('cache stats', '/cache/stats', 'GET', get('/cache/stats')),
+    ]
+
+
+def uncovered_rules(app, cases):
+    covered = {(rule, method) for _, rule, method, _ in cases}
+    return sorted((rule.rule, method) for rule in app.url_map.iter_rules()
+                  for method in rule.methods - {'HEAD', 'OPTIONS'}
+                  if rule.endpoint != 'static' and (rule.rule, method) not in covered)
+
+#----------------------------------------------------------------------------#
+# Measurement.
+#----------------------------------------------------------------------------#
+
+
+def percentile(values, p):
+    # nearest rank
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def measure(app, engine, case, requests):
+    name, _, method, build = case
+    statements = []
+    timing = False
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # builders run setup statements of their own
+        if timing:
+            statements[-1] += 1
+
+    client = app.test_client()
+    latencies = []
+    status = None
+    event.listen(engine, 'before_cursor_execute', count)
+    # the form handlers print() their input
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(WARMUP + requests):
+            path, kwargs = build()
+            statements.append(0)
+            timing = True
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            timing = False
+            response.close()
+            status = response.status_code
+            if i >= WARMUP:
+                latencies.append(elapsed * 1000)
+            else:
+                statements.pop()
+    event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'method': method,
+        'status': status,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries': max(statements),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        # the p99 of a few dozen requests is their slowest one
+        keys = ('p50_ms', 'p99_ms') if results['requests'] >= 100 else ('p50_ms',)
+        for key in keys:
+            if result[key] > before[key] * threshold and \
+                    result[key] - before[key] > NOISE_MS:
+                regressions.append(
+                    f'{name}: {key} {before[key]:.2f} -> {result[key]:.2f}')
+        if result['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: queries {before["queries"]} -> {result["queries"]}')
+    return regressions
+
+
+def print_results(results):
+    print(f'{"route":<24} {"status":>6} {"p50 ms":>9} {"p99 ms":>9} {"queries":>8}')
+    for name, result in results['routes'].items():
+        print(f'{name:<24} {result["status"]:>6} {result["p50_ms"]:>9.2f} '
+              f'{result["p99_ms"]:>9.2f} {result["queries"]:>8}')
+
+
+def main():
+    args = parse_args()
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = 'sqlite:///' + path
+    config.SQLALCHEMY_DATABASE_URI = url
+    config.SEARCH_INDEX_ENABLED = False
+    config.RESPONSE_CACHE_ENABLED = args.cache
+    config.WTF_CSRF_ENABLED = False
+    config.REQUEST_LOG = None
+    config.SLOW_QUERY_LOG = None
+    config.QUERY_BUDGET_ACTION = 'log'
+
+    import app as fyyur
+    from models import db
+
+    app = fyyur.create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+        venue_ids, artist_ids = catalog.seed(
+            db, args.venues, args.artists, args.shows, args.seed)
+        # searches and facet counts read the in-memory indexes, as they do
+        # once a worker is warm
+        for index in fyyur.SEARCH_INDEXES:
+            index.build(db.session)
+        cases = build_cases(app, db, venue_ids, artist_ids)
+        engine = db.engine
+        db.session.remove()
+
+    results = {
+        'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'database': engine.dialect.name,
+        'catalog': {'venues': args.venues, 'artists': args.artists,
+                    'shows': args.shows, 'seed': args.seed},
+        'requests': args.requests,
+        'cache': args.cache,
+        'routes': {},
+    }
+    for case in cases:
+        # test client requests run in their own app context
+        results['routes'][case[0]] = measure(app, engine, case, args.requests)
+    print_results(results)
+
+    for rule, method in uncovered_rules(app, cases):
+        print(f'not benchmarked: {method} {rule}')
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {output}')
+
+    if args.database_url is None:
+        engine.dispose()
+        os.remove(url[len('sqlite:///'):])
+
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f'no baseline at {args.compare}, write one with --output first')
+            sys.exit(1)
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#----------------------------------------------------------------------------#
+# Time to first byte and peak memory of the listing pages, streamed and
+# buffered, as the catalog grows.
+#
+#   python benchmarks/streaming.py [--sizes 1000,10000,50000] [--requests 5]
+#       [--paths /venues,/artists] [--seed 0]
+#
+# For each size a catalog of that many venues and twice as many artists
+# (see catalog.py) is seeded into a temporary SQLite database. Every page is
+# then requested in a fresh process per page and mode, so the peak RSS
+# growth of one run is not hidden by an earlier one, with the response cache
+# off. TTFB is the time until the first chunk of the body arrives through
+# the test client; the median of --requests requests is reported.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config  # noqa: E402
+
+MODES = ('buffered', 'streamed')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare streamed and buffered rendering of the listing pages.')
+    parser.add_argument('--sizes', default='1000,10000,50000',
+                        help='comma separated venue counts')
+    parser.add_argument('--paths', default='/venues,/artists')
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    # used by the child processes
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def configure(url):
+    config.SQLALCHEMY_DATABASE_URI = url
+    config.SEARCH_INDEX_ENABLED = False
+    config.RESPONSE_CACHE_ENABLED = False
+    config.MIGRATIONS_ENABLED = False
+    config.REQUEST_LOG = None
+    config.SLOW_QUERY_LOG = None
+
+
+def peak_rss_kb():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def seed(size, seed_value):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    url = 'sqlite:///' + path
+    # shows only feed the upcoming counts here, a few per venue are enough
+    subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.py'),
+         '--database-url', url, '--venues', str(size), '--artists', str(size * 2),
+         '--shows', str(size * 2), '--seed', str(seed_value)],
+        capture_output=True, check=True)
+    return path, url
+
+
+def measure(args):
+    configure(args.database_url)
+    config.STREAM_LISTINGS = args.mode == 'streamed'
+
+    from app import create_app
+
+    app = create_app()
+    app.logger.disabled = True
+    client = app.test_client()
+    # loads the layout, filters and database connection outside the figures
+    client.get('/').close()
+    baseline = peak_rss_kb()
+
+    ttfb, total, size = [], [], 0
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = client.get(args.path, buffered=False)
+        chunks = iter(response.response)
+        size = len(next(chunks, b''))
+        ttfb.append(time.perf_counter() - started)
+        size += sum(len(chunk) for chunk in chunks)
+        total.append(time.perf_counter() - started)
+        response.close()
+    print(json.dumps({
+        'ttfb_ms': median(ttfb) * 1000,
+        'total_ms': median(total) * 1000,
+        'bytes': size,
+        'peak_rss_kb': peak_rss_kb() - baseline,
+    }))
+
+
+def run_child(url, mode, path, args):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--database-url', url,
+         '--mode', mode, '--path', path, '--requests', str(args.requests)],
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.mode:
+        measure(args)
+        return
+
+    print(f'{"venues":>7} {"path":<10} {"mode":<9} {"TTFB ms":>9} {"total ms":>9} '
+          f'{"KB":>8} {"peak RSS +KB":>13}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        path, url = seed(size, args.seed)
+        try:
+            for page in args.paths.split(','):
+                for mode in MODES:
+                    result = run_child(url, mode, page, args)
+                    print(f'{size:>7} {page:<10} {mode:<9} {result["ttfb_ms"]:>9.2f} '
+                          f'{result["total_ms"]:>9.2f} {result["bytes"] // 1024:>8} '
+                          f'{result["peak_rss_kb"]:>13}')
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
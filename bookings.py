@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import heapq
+from sqlalchemy.exc import IntegrityError
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Double bookings.
+#
+# A venue, and an artist, can only play one show at a time: their shows'
+# [start_time, end_time) ranges must not overlap. PostgreSQL enforces this
+# with exclusion constraints (see models.py); book() is the check the views
+# run on every database, and show_conflicts() reports the overlaps already
+# stored, e.g. by bulk imports, which bypass the check.
+#----------------------------------------------------------------------------#
+
+OWNERS = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+
+# As long as an owner's shows do not overlap each other, only the latest one
+# starting before the new show ends can overlap it: any earlier show that
+# did would end after the new show starts, and so after that latest one
+# started. That makes the check a single seek down the (owner, start_time)
+# index per owner instead of a scan of the owner's shows.
+def latest_before(owner_column, owner_id, end_time, exclude_id=None):
+    query = db.session.query(Show).filter(owner_column == owner_id,
+                                          Show.start_time < end_time)
+    if exclude_id is not None:
+        query = query.filter(Show.id != exclude_id)
+    return query.order_by(db.desc(Show.start_time)).first()
+
+
+# returns [(owner kind, show)] for the booked shows that overlap show,
+# whether show is flushed yet or not
+def conflicts(show):
+    found = []
+    for kind, column in OWNERS:
+        latest = latest_before(column, getattr(show, kind + '_id'), show.end_time, show.id)
+        if latest is not None and latest.end_time > show.start_time:
+            found.append((kind, latest))
+    return found
+
+
+# PostgreSQL's exclusion_violation SQLSTATE
+EXCLUSION_VIOLATION = '23P01'
+
+
+# adds show to the session and flushes it unless it overlaps a booked show,
+# and returns the conflicts found; the caller rolls back when there are
+# some. The check runs before the INSERT, which PostgreSQL's exclusion
+# constraints would refuse, and a booking committed concurrently since is
+# reported the same way when the constraints refuse it anyway. The check
+# runs again after the flush for the other databases: the INSERT takes
+# SQLite's write lock first, so a concurrent booking either committed
+# before then or waits until this transaction is over
+def book(show):
+    found = conflicts(show)
+    if found:
+        return found
+    db.session.add(show)
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        if getattr(e.orig, 'pgcode', None) != EXCLUSION_VIOLATION:
+            raise
+        db.session.rollback()
+        found = conflicts(show)
+        if not found:
+            raise
+        return found
+    return conflicts(show)
+
+
+# yields (owner kind, owner id, earlier show, later show) for every pair of
+# overlapping shows in one pass over the shows in start order. Each owner
+# keeps a heap of its shows still running at the current start time, ended
+# shows are popped as the sweep passes their end, and whatever is left
+# overlaps the next show to start
+def show_conflicts(batch_size=1000):
+    rows = db.session.query(Show.id, Show.venue_id, Show.artist_id,
+                            Show.start_time, Show.end_time) \
+        .order_by(Show.start_time, Show.id).yield_per(batch_size)
+    running = {}
+    for show in rows:
+        for kind, _ in OWNERS:
+            owner_id = getattr(show, kind + '_id')
+            heap = running.setdefault((kind, owner_id), [])
+            while heap and heap[0][0] <= show.start_time:
+                heapq.heappop(heap)
+            for _, _, earlier in heap:
+                yield kind, owner_id, earlier, show
+            # the id breaks ties between shows ending at the same time
+            heapq.heappush(heap, (show.end_time, show.id, show))
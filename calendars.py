@@ -0,0 +1,89 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import url_for
+
+#----------------------------------------------------------------------------#
+# iCalendar feeds (RFC 5545).
+#
+# Each show becomes a VEVENT written as soon as its row is read, so a feed
+# of any length streams with flat memory. Show times are stored as the
+# venue's local time without a zone, so they are written as floating times
+# that calendar clients show as is; DTSTAMP, which must be UTC, comes from
+# updated_at, which is.
+#----------------------------------------------------------------------------#
+
+PRODID = '-//Fyyur//Shows//EN'
+CRLF = '\r\n'
+# content lines longer than this many octets are folded
+LINE_OCTETS = 75
+# events written out per chunk of the response
+EVENTS_PER_CHUNK = 100
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    if len(line.encode('utf-8')) <= LINE_OCTETS:
+        return line + CRLF
+    # never splits a multi-byte character; continuation lines start with
+    # a space, which counts towards their length
+    parts, current, size = [], '', 0
+    for char in line:
+        octets = len(char.encode('utf-8'))
+        if size + octets > LINE_OCTETS:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += octets
+    parts.append(current)
+    return CRLF.join(parts) + CRLF
+
+
+def floating_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def utc_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def event(show, host):
+    location = ', '.join(part for part in (show.address, show.city, show.state) if part)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:show-{show.show_id}@{host}',
+        f'DTSTAMP:{utc_time(show.updated_at)}',
+        f'DTSTART:{floating_time(show.start_time)}',
+        f'DTEND:{floating_time(show.end_time)}',
+        f'SUMMARY:{escape(show.artist_name)} at {escape(show.venue_name)}',
+        f'LOCATION:{escape(location)}',
+        'URL:' + url_for('main.show_artist', artist_id=show.artist_id, _external=True),
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+
+# yields the feed in chunks; shows are the calendar rows of app.py, in
+# start order
+def feed(name, shows, host):
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+    ))
+    chunk = []
+    for show in shows:
+        chunk.append(event(show, host))
+        if len(chunk) == EVENTS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(fold('END:VCALENDAR'))
+    yield ''.join(chunk)
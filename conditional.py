@@ -0,0 +1,176 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import Response, current_app, g, request, session
+from models import db, Venue, Artist, Show, matches_refreshed, show_counters
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# each function below returns one row of aggregates, fetched in a single
+# statement, that changes whenever the page built from them would: the
+# newest updated_at, read through its index, and a count of the rows, read
+# from the smallest index, which catches deletes. The entity pages count
+# their own shows through the (owner, start_time) indexes, and the number
+# already started catches shows moving from upcoming to past as time passes
+
+
+def aggregate(*queries):
+    return db.session.query(*[query.scalar_subquery() for query in queries]).one()
+
+
+def count(query_column):
+    return db.session.query(db.func.count(query_column))
+
+
+def newest(query_column):
+    return db.session.query(db.func.max(query_column))
+
+
+# the upcoming show counts listed on /venues are the stored counters, which
+# shows only leave as they start when `flask refresh-counters` runs. It is
+# a local time, like show times, so it goes into the ETag as text and stays
+# out of the UTC Last-Modified
+def counters_refreshed_at():
+    return db.session.query(db.cast(show_counters.c.refreshed_at, db.String))
+
+
+def venues_validators():
+    return aggregate(
+        newest(Venue.updated_at), count(Venue.id),
+        newest(Show.updated_at), count(Show.id), counters_refreshed_at())
+
+
+def artists_validators():
+    return aggregate(newest(Artist.updated_at), count(Artist.id))
+
+
+def shows_validators():
+    return aggregate(
+        newest(Show.updated_at), count(Show.id),
+        newest(Venue.updated_at), newest(Artist.updated_at))
+
+
+# the last `flask matches` run, for the matches listed on entity pages
+def matches_refreshed_at():
+    return db.session.query(matches_refreshed.c.refreshed_at)
+
+
+def venue_validators(venue_id):
+    shows = Show.venue_id == venue_id
+    return aggregate(
+        db.session.query(Venue.updated_at).filter(Venue.id == venue_id),
+        newest(Show.updated_at).filter(shows), count(Show.id).filter(shows),
+        count(Show.id).filter(shows, Show.start_time <= datetime.now()),
+        newest(Artist.updated_at).join(Show, Show.artist_id == Artist.id).filter(shows),
+        matches_refreshed_at())
+
+
+def artist_validators(artist_id):
+    shows = Show.artist_id == artist_id
+    return aggregate(
+        db.session.query(Artist.updated_at).filter(Artist.id == artist_id),
+        newest(Show.updated_at).filter(shows), count(Show.id).filter(shows),
+        count(Show.id).filter(shows, Show.start_time <= datetime.now()),
+        newest(Venue.updated_at).join(Show, Show.venue_id == Venue.id).filter(shows),
+        matches_refreshed_at())
+
+
+# the calendars list an owner's shows from CALENDAR_PAST_DAYS ago on, so the
+# number of its shows started before then catches shows leaving the window
+def calendar_validators(owner, owner_id):
+    owner_column, other, other_column = (Show.venue_id, Artist, Show.artist_id) \
+        if owner is Venue else (Show.artist_id, Venue, Show.venue_id)
+    window = datetime.now() - timedelta(days=current_app.config['CALENDAR_PAST_DAYS'])
+    shows = owner_column == owner_id
+    return aggregate(
+        db.session.query(owner.updated_at).filter(owner.id == owner_id),
+        newest(Show.updated_at).filter(shows), count(Show.id).filter(shows),
+        count(Show.id).filter(shows, Show.start_time < window),
+        newest(other.updated_at).join(Show, other_column == other.id).filter(shows))
+
+
+def venue_calendar_validators(venue_id):
+    return calendar_validators(Venue, venue_id)
+
+
+def artist_calendar_validators(artist_id):
+    return calendar_validators(Artist, artist_id)
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+
+def as_utc(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    # without an ETag only the newest timestamp can be compared, which
+    # cannot see deletes; clients send both when they can
+    since = request.if_modified_since
+    return since is not None and last_modified <= as_utc(since)
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # always revalidate instead of guessing freshness from Last-Modified
+    response.cache_control.no_cache = True
+    return response
+
+
+# answers If-None-Match / If-Modified-Since with 304 from the validators
+# alone, before the view queries or renders anything. The validators row
+# for a missing entity has no timestamp, which leaves the view to 404. A
+# page the response cache checked a moment ago is served, or answered with
+# 304, from the cache without running them
+def conditional(validators):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return f(*args, **kwargs)
+
+            cache = current_app.extensions.get('response_cache')
+            entry = cache.fresh() if cache is not None else None
+            if entry is not None:
+                etag, last_modified = entry['etag'], entry['last_modified']
+                if is_not_modified(etag, last_modified):
+                    response = Response(status=304)
+                else:
+                    response = cache.respond(entry)
+                return with_validators(response, etag, last_modified)
+
+            row = validators(**kwargs)
+            timestamps = [value for value in row if isinstance(value, datetime)]
+            if row[0] is None or not timestamps:
+                return f(*args, **kwargs)
+
+            last_modified = as_utc(max(timestamps))
+            etag = hashlib.sha1(repr(
+                (current_app.config.get('ETAG_VERSION'), tuple(row))).encode()).hexdigest()
+
+            if is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                # the response cache only serves pages stored under this ETag
+                g.etag, g.last_modified = etag, last_modified
+                response = f(*args, **kwargs)
+                if not isinstance(response, Response):
+                    response = current_app.make_response(response)
+                if response.status_code != 200:
+                    return response
+            return with_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
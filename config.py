@@ -1,11 +1,118 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Must be the same in every worker. Unset, a key is generated once into
+# SECRET_KEY_FILE (instance/secret_key by default) and shared from there
+SECRET_KEY = os.environ.get('SECRET_KEY')
+SECRET_KEY_FILE = os.environ.get('SECRET_KEY_FILE')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
 DEBUG = True
 
+# Set up Flask-Migrate for the `flask db` commands; web workers do without
+MIGRATIONS_ENABLED = os.environ.get('MIGRATIONS_ENABLED', '1') == '1'
+
 # Connect to the database
 
-SQLALCHEMY_DATABASE_URI = 'postgresql://shiminliang@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://shiminliang@localhost:5432/fyyur')
+
+# Optional read replica: GET requests read from it, see database.py.
+# Locally two SQLite files can stand in for primary and replica
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL}
+
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Connection pool, ignored for SQLite
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# PostgreSQL only; 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+
+# Number of shows listed per page at /shows
+SHOWS_PER_PAGE = 30
+SHOWS_MAX_PER_PAGE = 100
+
+# Venue and artist calendars and .ics feeds list shows from this many days
+# ago on, unless ?from= asks for another start
+CALENDAR_PAST_DAYS = 30
+
+# Stream the venue, artist and show listings to the client while they are
+# rendered instead of building the whole page first. Rows are fetched
+# STREAM_BATCH_SIZE at a time and sent every STREAM_BUFFER_SIZE template chunks
+STREAM_LISTINGS = os.environ.get('STREAM_LISTINGS', '1') == '1'
+STREAM_BATCH_SIZE = 500
+STREAM_BUFFER_SIZE = 64
+
+# What to do when a view runs more queries than its query_budget:
+# 'log', 'raise' (use in tests) or a callable(endpoint, count, budget)
+QUERY_BUDGET_ACTION = 'log'
+
+# Number of formatted timestamps kept by the datetime filter
+DATETIME_FORMAT_CACHE_SIZE = 16384
+
+# Answer venue/artist searches from an in-memory trigram index
+SEARCH_INDEX_ENABLED = True
+# Build the indexes in a background thread instead of blocking startup.
+# gunicorn.conf.py turns it off to build them once in the preloading master
+SEARCH_INDEX_BACKGROUND = os.environ.get('SEARCH_INDEX_BACKGROUND', '1') == '1'
+# How often each process reads the changes logged by the others into its
+# indexes, and how long the log keeps them
+SEARCH_INDEX_SYNC_SECONDS = float(os.environ.get('SEARCH_INDEX_SYNC_SECONDS', 5))
+SEARCH_INDEX_CHANGES_KEEP_HOURS = 24
+
+# Completions returned by /api/autocomplete unless ?limit= asks otherwise
+AUTOCOMPLETE_LIMIT = 10
+
+# Radius of /venues/nearby and /artists/<id>/venues/nearby in km unless
+# ?radius= asks otherwise, up to NEARBY_MAX_RADIUS_KM; the closest
+# NEARBY_LIMIT venues are listed
+NEARBY_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_LIMIT = 50
+
+# Matches kept per seeking venue and artist by `flask matches`, scored in
+# MATCH_WORKERS processes (0 for one per core)
+MATCHES_PER_ENTITY = 6
+MATCH_WORKERS = int(os.environ.get('MATCH_WORKERS', 0))
+
+# Used by `flask geocode` when no gazetteer file is given: a callable
+# (address, city, state) returning (latitude, longitude) or None
+GEOCODER = None
+
+# Cache rendered listing and detail pages until a write touches them.
+# RESPONSE_CACHE_BACKEND may be any object with get/set/clear, e.g. a thin
+# wrapper over memcached or redis shared by all workers
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TTL = 60
+# Pages behind ETags are served without checking them against the database
+# for this long after the last check; writes made by other workers and
+# Core statements show up after at most this delay
+RESPONSE_CACHE_REVALIDATE_SECONDS = 5
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_BACKEND = None
+
+# Mixed into the ETags of entity pages; bump it when templates change so
+# browsers stop revalidating pages rendered by the old ones
+ETAG_VERSION = '1'
+
+# Link the source stylesheets and scripts even once `flask assets` has built
+# the bundles, so edits show up without a rebuild
+ASSETS_DEBUG = os.environ.get('ASSETS_DEBUG', '0') == '1'
+
+# Rows per batch for `flask import`
+IMPORT_BATCH_SIZE = 5000
+
+# Per-request query count, database and template time, sent in a
+# Server-Timing header and logged as JSON lines to REQUEST_LOG. Statements
+# slower than SLOW_QUERY_MS go to SLOW_QUERY_LOG. Relative paths are under
+# the instance folder; None disables either log
+INSTRUMENTATION_ENABLED = True
+REQUEST_LOG = os.environ.get('REQUEST_LOG', 'requests.log')
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'slow-queries.log')
+SLOW_QUERY_MS = 100
@@ -0,0 +1,118 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy import event
+from models import db, Venue, Artist, Show, show_counters
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venue and Artist carry upcoming_shows_count / past_shows_count so listings
+# read them without touching Show. Creating a show bumps the counters of its
+# venue and artist; deleting one recounts them. Time passing is handled by
+# refresh(), run periodically through `flask refresh-counters`, which
+# recounts every venue and artist with a show that started since the last
+# refresh.
+#
+# Counter updates keep updated_at as it was: it records edits of the venue
+# or artist, which `/api/*?since=` and `flask matches` go by.
+#----------------------------------------------------------------------------#
+
+OWNERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def recount(connection, model, show_column, ids=None, now=None):
+    # exact counts through the (venue_id, start_time) and
+    # (artist_id, start_time) indexes; ids may be a list or a subquery
+    now = now or datetime.now()
+    shows = db.select(db.func.count(Show.id)).where(show_column == model.id)
+    stmt = model.__table__.update().values(
+        upcoming_shows_count=shows.where(Show.start_time > now).scalar_subquery(),
+        past_shows_count=shows.where(Show.start_time <= now).scalar_subquery(),
+        updated_at=model.updated_at)
+    if ids is not None:
+        stmt = stmt.where(model.id.in_(ids))
+    connection.execute(stmt)
+
+
+def recount_shows_of(connection, venue_ids, artist_ids):
+    if venue_ids:
+        recount(connection, Venue, Show.venue_id, list(venue_ids))
+    if artist_ids:
+        recount(connection, Artist, Show.artist_id, list(artist_ids))
+
+
+# adds {id: (upcoming, past)} to the counters in one executemany, for
+# shows written without going through the ORM
+def add_counts(connection, model, counts):
+    if not counts:
+        return
+    table = model.__table__
+    stmt = table.update().where(table.c.id == db.bindparam('owner_id')).values(
+        upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+        past_shows_count=table.c.past_shows_count + db.bindparam('past'),
+        updated_at=table.c.updated_at)
+    connection.execute(stmt, [{'owner_id': id, 'upcoming': upcoming, 'past': past}
+                              for id, (upcoming, past) in counts.items()])
+
+
+@event.listens_for(Show, 'after_insert')
+def count_show(mapper, connection, show):
+    column = 'upcoming_shows_count' if show.start_time > datetime.now() else 'past_shows_count'
+    for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        table = model.__table__
+        connection.execute(table.update().where(table.c.id == id)
+                           .values({column: table.c[column] + 1,
+                                    'updated_at': table.c.updated_at}))
+
+
+# a deleted show may already have started without refresh() having moved it
+# to the past yet, so recount instead of guessing which counter holds it
+@event.listens_for(Show, 'after_delete')
+def uncount_show(mapper, connection, show):
+    recount_shows_of(connection, [show.venue_id], [show.artist_id])
+
+
+# shows removed by ON DELETE CASCADE along with their venue or artist fire
+# no events; note the other side of those shows before the delete and
+# recount it afterwards
+def recount_cascaded(model, show_column, counterpart, counterpart_column):
+    @event.listens_for(model, 'before_delete')
+    def find_counterparts(mapper, connection, target):
+        ids = connection.execute(db.select(counterpart_column)
+                                 .where(show_column == target.id).distinct()).scalars().all()
+        connection.info.setdefault('counters_cascaded', []).append(
+            (counterpart, counterpart_column, ids))
+
+    @event.listens_for(model, 'after_delete')
+    def recount_counterparts(mapper, connection, target):
+        for counterpart, column, ids in connection.info.pop('counters_cascaded', []):
+            if ids:
+                recount(connection, counterpart, column, ids)
+
+
+recount_cascaded(Venue, Show.venue_id, Artist, Show.artist_id)
+recount_cascaded(Artist, Show.artist_id, Venue, Show.venue_id)
+
+
+def refresh(full=False):
+    now = datetime.now()
+    since = db.session.execute(db.select(show_counters.c.refreshed_at)).scalar()
+    connection = db.session.connection()
+
+    for model, show_column in OWNERS:
+        if since is None or full:
+            recount(connection, model, show_column, now=now)
+        else:
+            started = db.select(show_column).where(
+                Show.start_time > since, Show.start_time <= now).distinct()
+            recount(connection, model, show_column, started, now=now)
+
+    if since is None:
+        db.session.execute(show_counters.insert().values(id=1, refreshed_at=now))
+    else:
+        db.session.execute(show_counters.update().values(refreshed_at=now))
+    db.session.commit()
+    return since, now
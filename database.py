@@ -0,0 +1,145 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import time
+from flask import g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+#----------------------------------------------------------------------------#
+# Engine options.
+#----------------------------------------------------------------------------#
+
+
+# pool settings from config.py; SQLite gets none of them since flask_sqlalchemy
+# gives file databases a NullPool, which takes no pool arguments
+def engine_options(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS'] and \
+            config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        options['connect_args'] = {
+            'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        }
+    return options
+
+
+# engines hold open connections that must not be shared with forked
+# workers; gunicorn.conf.py calls this in the master before each fork
+def dispose_engines(app, db):
+    with app.app_context():
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+            db.get_engine(app, bind).dispose()
+
+#----------------------------------------------------------------------------#
+# Secret key.
+#
+# Sessions and flashed messages are signed with SECRET_KEY, so every worker
+# must use the same one. Without SECRET_KEY in the environment a random key
+# is generated once into SECRET_KEY_FILE and read by every process after.
+#----------------------------------------------------------------------------#
+
+
+def load_secret_key(app):
+    if app.config.get('SECRET_KEY'):
+        return
+    path = app.config.get('SECRET_KEY_FILE') or \
+        os.path.join(app.instance_path, 'secret_key')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside and linked into place, which fails if another
+        # worker got there first, so nobody reads a half written key
+        temp = f'{path}.{os.getpid()}'
+        with os.fdopen(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(os.urandom(32).hex())
+        try:
+            os.link(temp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp)
+    with open(path) as f:
+        app.config['SECRET_KEY'] = f.read().strip()
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# With DATABASE_REPLICA_URL set, GET and HEAD requests, and the searches
+# posted from the navbar, read from the replica bind and everything else,
+# including any flush, goes to the primary. After a request commits a
+# write, its client's reads stay on the primary for REPLICA_STICKY_SECONDS
+# so it reads its own writes while the replica catches up.
+#----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD')
+# POST routes that only read
+READ_ENDPOINTS = {'main.search_venues', 'main.search_artists'}
+
+
+def is_read(request):
+    return request.method in READ_METHODS or request.endpoint in READ_ENDPOINTS
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self._flushing and has_app_context() and g.get('read_from_replica'):
+            return self.db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def has_replica(app):
+    return 'replica' in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+# whether the client wrote in the last REPLICA_STICKY_SECONDS, and so reads
+# from the primary; never set without a replica
+def reads_own_writes():
+    return session.get('primary_until', 0) >= time.time()
+
+
+# marks the requests that committed a flush, rather than every POST: form
+# errors and refused bookings write nothing
+@event.listens_for(RoutingSession, 'after_flush')
+def note_flush(session, flush_context):
+    session.info['flushed'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def note_write(session):
+    if session.info.pop('flushed', False) and has_request_context():
+        g.wrote_to_primary = True
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_flush(session):
+    session.info.pop('flushed', None)
+
+
+def init_replica_routing(app):
+    @app.before_request
+    def choose_database():
+        g.read_from_replica = has_replica(app) and is_read(request) and \
+            not reads_own_writes()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('wrote_to_primary') and has_replica(app):
+            session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
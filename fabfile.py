@@ -4,15 +4,27 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+BENCHMARK = "python benchmarks/routes.py --venues 200 --artists 400 --shows 5000 --requests 20"
+
+
 def test():
+    # runs the tests, then fails on a startup over budget, or on routes
+    # slower than, or running more queries than, the baseline. Baselines are
+    # per machine and not committed: write one with `fab baseline` first,
+    # and again after intended changes
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest tests/ && python benchmarks/import_time.py && " + BENCHMARK +
+            " --compare benchmarks/results/baseline.json", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def baseline():
+    local(BENCHMARK + " --output benchmarks/results/baseline.json")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,9 +51,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # seeds a temporary SQLite database on the dyno, not the app's database
+    local("heroku run " + BENCHMARK)
 
 
 def deploy():
@@ -1,21 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Optional
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, FloatField
+from wtforms.validators import DataRequired, InputRequired, URL, Optional, NumberRange
+from models import DEFAULT_SHOW_DURATION
 
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default=datetime.today()
     )
+    # in minutes
+    duration = IntegerField(
+        'duration', validators=[InputRequired(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_SHOW_DURATION // timedelta(minutes=1)
+    )
 
 
 class VenueForm(Form):
@@ -84,6 +90,14 @@ class VenueForm(Form):
     address = StringField(
         'address', validators=[DataRequired()]
     )
+    # left empty, the venue is not found by /venues/nearby until `flask
+    # geocode` locates it
+    latitude = FloatField(
+        'latitude', validators=[Optional(), NumberRange(min=-90, max=90)]
+    )
+    longitude = FloatField(
+        'longitude', validators=[Optional(), NumberRange(min=-180, max=180)]
+    )
     phone = StringField(
         'phone'
     )
@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, make_transient_to_detached
+from models import db, Genre
+
+#----------------------------------------------------------------------------#
+# Genre resolution.
+#----------------------------------------------------------------------------#
+
+# process-wide Genre.name -> Genre.id, only holding committed rows
+genre_ids = {}
+genre_ids_lock = threading.Lock()
+
+
+def insert_missing_genres(names):
+    # relies on the unique index on Genre.name so concurrent submissions
+    # adding the same genre cannot create duplicates
+    rows = [{'name': name} for name in names]
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(Genre.__table__).values(rows) \
+            .on_conflict_do_nothing(index_elements=['name'])
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(Genre.__table__).values(rows) \
+            .on_conflict_do_nothing(index_elements=['name'])
+    else:
+        stmt = Genre.__table__.insert().values(rows)
+    db.session.execute(stmt)
+
+
+def fetch_genre_ids(names):
+    return dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+
+
+# returns {name: id} for the given names, creating the missing genres.
+# Known names cost no query at all; otherwise one SELECT ... IN, plus one
+# INSERT and one SELECT when some names are new
+def resolve_genre_ids(names):
+    names = list(dict.fromkeys(names))
+    with genre_ids_lock:
+        ids = {name: genre_ids[name] for name in names if name in genre_ids}
+
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = fetch_genre_ids(missing)
+        with genre_ids_lock:
+            genre_ids.update(found)
+        ids.update(found)
+
+        missing = [name for name in missing if name not in found]
+        if missing:
+            insert_missing_genres(missing)
+            created = fetch_genre_ids(missing)
+            # cached once the transaction commits, see below
+            db.session.info.setdefault('genre_ids_pending', {}).update(created)
+            ids.update(created)
+    return ids
+
+
+# returns Genre instances for the given names in the current session,
+# without loading the rows that are already known
+def resolve_genres(names):
+    ids = resolve_genre_ids(names)
+    genres = []
+    for name in dict.fromkeys(names):
+        genre = Genre(id=ids[name], name=name)
+        make_transient_to_detached(genre)
+        genres.append(db.session.merge(genre, load=False))
+    return genres
+
+
+@event.listens_for(Session, 'after_commit')
+def cache_created_genres(session):
+    created = session.info.pop('genre_ids_pending', None)
+    if created:
+        with genre_ids_lock:
+            genre_ids.update(created)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_created_genres(session):
+    session.info.pop('genre_ids_pending', None)
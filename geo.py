@@ -0,0 +1,236 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import heapq
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from models import db, log_index_changes
+
+#----------------------------------------------------------------------------#
+# Distances.
+#----------------------------------------------------------------------------#
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # haversine, on a spherical earth: within 0.5% of the real distance
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+# the smallest latitude and longitude ranges holding every point within
+# radius_km of (lat, lng): (south, north, [(west, east)]), with the
+# longitudes split in two where they cross the antimeridian
+def bounding_box(lat, lng, radius_km):
+    angle = radius_km / EARTH_RADIUS_KM
+    south = max(lat - math.degrees(angle), -90)
+    north = min(lat + math.degrees(angle), 90)
+    # the circle is widest short of its northern or southern edge, by
+    # asin(sin(angle) / cos(lat)) degrees of longitude; past a pole it
+    # spans every longitude
+    ratio = math.sin(angle) / math.cos(math.radians(lat)) if abs(lat) < 90 else 2
+    if south == -90 or north == 90 or ratio >= 1:
+        return south, north, [(-180, 180)]
+    width = math.degrees(math.asin(ratio))
+    west, east = lng - width, lng + width
+    if west < -180:
+        return south, north, [(west + 360, 180), (-180, east)]
+    if east > 180:
+        return south, north, [(west, 180), (-180, east - 360)]
+    return south, north, [(west, east)]
+
+#----------------------------------------------------------------------------#
+# Grid index.
+#
+# /venues/nearby looks venues up by distance. Each venue with coordinates
+# sits in one cell of a grid of CELL_DEGREES squares, so a radius query
+# only reads the cells overlapping the circle's bounding box and measures
+# the distance to the venues in them, whatever the size of the catalog.
+# Each process keeps its own copy, built from the database and kept current
+# like the search indexes; while it is cold the same box is read from the
+# (latitude, longitude) index instead.
+#----------------------------------------------------------------------------#
+
+# about 28 km north to south; a 25 km radius reads 9 to 16 cells
+CELL_DEGREES = 0.25
+
+
+def cell(degrees):
+    return math.floor(degrees / CELL_DEGREES)
+
+
+class GridIndex:
+    def __init__(self, model):
+        self.model = model
+        self.points = {}
+        self.cells = defaultdict(set)
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def entry(self, target):
+        return target.latitude, target.longitude
+
+    def add(self, id, entry):
+        lat, lng = entry
+        with self.lock:
+            self._remove(id)
+            # venues without coordinates are not found by distance
+            if lat is not None and lng is not None:
+                self.points[id] = (lat, lng)
+                self.cells[cell(lat), cell(lng)].add(id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        point = self.points.pop(id, None)
+        if point is None:
+            return
+        key = (cell(point[0]), cell(point[1]))
+        ids = self.cells[key]
+        ids.discard(id)
+        if not ids:
+            del self.cells[key]
+
+    def build(self, session):
+        points = {}
+        cells = defaultdict(set)
+        query = session.query(self.model.id, self.model.latitude, self.model.longitude) \
+            .filter(self.model.latitude.isnot(None), self.model.longitude.isnot(None))
+        for id, lat, lng in query:
+            points[id] = (lat, lng)
+            cells[cell(lat), cell(lng)].add(id)
+        with self.lock:
+            self.points, self.cells = points, cells
+        self.ready = True
+
+    # returns up to limit [(distance in km, id)] within radius_km of
+    # (lat, lng), closest first, or None while the index is cold
+    def near(self, lat, lng, radius_km, limit):
+        if not self.ready:
+            return None
+        south, north, ranges = bounding_box(lat, lng, radius_km)
+        found = []
+        with self.lock:
+            for row in range(cell(south), cell(north) + 1):
+                for west, east in ranges:
+                    for column in range(cell(west), cell(east) + 1):
+                        for id in self.cells.get((row, column), ()):
+                            distance = distance_km(lat, lng, *self.points[id])
+                            if distance <= radius_km:
+                                found.append((distance, id))
+        return heapq.nsmallest(limit, found)
+
+#----------------------------------------------------------------------------#
+# SQL.
+#----------------------------------------------------------------------------#
+
+
+# the matches of GridIndex.near() from a range scan over the bounding box
+def query_near(model, lat, lng, radius_km, limit):
+    south, north, ranges = bounding_box(lat, lng, radius_km)
+    query = db.session.query(model.id, model.latitude, model.longitude) \
+        .filter(model.latitude.between(south, north),
+                db.or_(*[model.longitude.between(west, east) for west, east in ranges]))
+    found = []
+    for id, point_lat, point_lng in query:
+        distance = distance_km(lat, lng, point_lat, point_lng)
+        if distance <= radius_km:
+            found.append((distance, id))
+    return heapq.nsmallest(limit, found)
+
+
+# where an artist's city is: the middle of the venues located there
+def city_center(model, city, state):
+    return db.session.query(db.func.avg(model.latitude), db.func.avg(model.longitude)) \
+        .filter(model.city == city, model.state == state,
+                model.latitude.isnot(None), model.longitude.isnot(None)).one()
+
+#----------------------------------------------------------------------------#
+# Offline geocoding.
+#
+# `flask geocode` fills in coordinates from a local gazetteer file instead
+# of calling a geocoding service per venue. The gazetteer is a CSV file, or
+# tab separated with a .tsv or .txt extension, with a header row naming at
+# least city, state, latitude and longitude columns; rows that also give an
+# address locate venues at that address, the others whole cities.
+#
+# Coordinates are written with Core executemany statements, like `flask
+# import`, and logged for the grid indexes of running web workers the same
+# way.
+#----------------------------------------------------------------------------#
+
+
+def place_key(*parts):
+    return tuple(' '.join(part.casefold().split()) if part else '' for part in parts)
+
+
+class Gazetteer:
+    def __init__(self, path):
+        self.places = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            delimiter = '\t' if path.endswith(('.tsv', '.txt')) else ','
+            for row in csv.DictReader(f, delimiter=delimiter):
+                try:
+                    point = (float(row['latitude']), float(row['longitude']))
+                except (TypeError, ValueError):
+                    continue
+                key = place_key(row.get('address'), row['city'], row['state'])
+                # the first row for a place wins, as in most gazetteers the
+                # main entry comes first
+                self.places.setdefault(key, point)
+
+    # the geocoding hook: any callable taking (address, city, state) and
+    # returning (latitude, longitude) or None will do
+    def locate(self, address, city, state):
+        if address:
+            point = self.places.get(place_key(address, city, state))
+            if point is not None:
+                return point
+        return self.places.get(place_key(None, city, state))
+
+
+# sets the coordinates of the model's rows that have none yet, or of every
+# row with overwrite, from locate(address, city, state). Returns the number
+# of rows located and of rows left as they were
+def geocode(model, locate, batch_size, overwrite=False):
+    address = getattr(model, 'address', db.null())
+    query = db.session.query(model.id, address, model.city, model.state)
+    if not overwrite:
+        query = query.filter(model.latitude.is_(None))
+    update = model.__table__.update() \
+        .where(model.__table__.c.id == db.bindparam('row_id')) \
+        .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'),
+                updated_at=db.bindparam('updated_at'))
+
+    located = missed = 0
+    last_id = 0
+    while True:
+        # keyset pages, so rows left without coordinates are not read again
+        rows = query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return located, missed
+        last_id = rows[-1][0]
+        now = datetime.utcnow()
+        values = []
+        for id, row_address, city, state in rows:
+            point = locate(row_address, city, state)
+            if point is None:
+                missed += 1
+            else:
+                values.append({'row_id': id, 'latitude': point[0], 'longitude': point[1],
+                               'updated_at': now})
+        if values:
+            db.session.execute(update, values)
+            log_index_changes(db.session.connection(), model.__tablename__,
+                              [value['row_id'] for value in values])
+            db.session.commit()
+        located += len(values)
@@ -0,0 +1,36 @@
+#----------------------------------------------------------------------------#
+# gunicorn settings, read from the working directory:
+#
+#   gunicorn
+#
+# The app is created once in the master (preload_app) and the workers are
+# forked from it, so they start instantly and share the loaded code and
+# search indexes copy-on-write instead of each building their own. Each
+# worker then keeps its copy current from the changes logged by all of
+# them (see search_index.IndexSync).
+#----------------------------------------------------------------------------#
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = '0.0.0.0:' + os.environ.get('PORT', '5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+# build the search indexes in the master before forking; a background
+# thread would not survive the fork
+os.environ.setdefault('SEARCH_INDEX_BACKGROUND', '0')
+# the workers never run `flask db`
+os.environ.setdefault('MIGRATIONS_ENABLED', '0')
+
+
+def pre_fork(server, worker):
+    from app import db
+    from database import dispose_engines
+
+    dispose_engines(server.app.wsgi(), db)
+    # objects loaded so far are never collected, so the collector does not
+    # touch, and copy, the pages the workers share
+    gc.freeze()
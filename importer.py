@@ -0,0 +1,269 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+import dateutil.parser
+import counters
+from genres import resolve_genre_ids
+from models import (db, Venue, Artist, Show, venue_genres, artist_genres, DEFAULT_SHOW_DURATION,
+                    log_index_changes)
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Venues and artists are identified by their natural key (name, city,
+# state); rows whose key already exists are skipped, so an import can be
+# re-run after a failure. Those without latitude and longitude can be
+# located afterwards with `flask geocode`. Shows refer to them either by
+# venue_id/artist_id or by venue_name/venue_city/venue_state and
+# artist_name/artist_city/artist_state, resolved through in-memory maps of
+# every key, and may give an end_time (by default they run for
+# DEFAULT_SHOW_DURATION).
+#
+# Rows are written with Core executemany statements (COPY for shows on
+# PostgreSQL) and committed batch by batch. They bypass the ORM events, so
+# each batch logs the venues and artists it adds, or whose upcoming shows
+# it adds to, for the search indexes of running web workers. The listing
+# and entity pages see the new rows through the counts and updated_at in
+# their validators, other cached pages once they expire. Shows are not
+# checked for double bookings either, except by PostgreSQL's exclusion
+# constraints; `flask show-conflicts` lists any that slipped in.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = ['name', 'city', 'state', 'address', 'latitude', 'longitude', 'phone',
+                'image_link', 'facebook_link', 'website_link', 'seeking_talent',
+                'seeking_description']
+ARTIST_FIELDS = ['name', 'city', 'state', 'latitude', 'longitude', 'phone', 'image_link',
+                 'facebook_link', 'website_link', 'seeking_venue', 'seeking_description']
+BOOLEAN_FIELDS = {'seeking_talent', 'seeking_venue'}
+FLOAT_FIELDS = {'latitude', 'longitude'}
+
+
+def read_rows(path):
+    # .csv files need a header row; anything else is read as JSON-Lines
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+    return bool(value)
+
+
+def parse_float(value):
+    # empty CSV cells and unreadable numbers leave the column NULL
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_genres(value):
+    # a JSON list, or a comma separated string in CSV files
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value if name.strip()]
+
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def natural_key(row, prefix=''):
+    return (row[prefix + 'name'], row[prefix + 'city'], row[prefix + 'state'])
+
+
+def load_keys(model):
+    query = db.session.query(model.id, model.name, model.city, model.state) \
+        .execution_options(stream_results=True).yield_per(10000)
+    return {(name, city, state): id for id, name, city, state in query}
+
+
+class ImportStats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def __str__(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.inserted / elapsed if elapsed else 0
+        return (f'{self.inserted} {self.kind} imported, {self.skipped} skipped '
+                f'in {elapsed:.1f}s ({rate:,.0f} rows/s)')
+
+
+def import_entities(model, fields, association, owner_column, path, batch_size):
+    stats = ImportStats(model.__tablename__.lower() + 's')
+    keys = load_keys(model)
+    now = datetime.utcnow()
+
+    for batch in batches(read_rows(path), batch_size):
+        rows = []
+        genres = {}
+        for row in batch:
+            key = natural_key(row)
+            if key in keys or key in genres:
+                stats.skipped += 1
+                continue
+            values = {field: row.get(field) or None for field in fields}
+            for field in BOOLEAN_FIELDS & set(fields):
+                values[field] = parse_bool(row.get(field))
+            for field in FLOAT_FIELDS & set(fields):
+                values[field] = parse_float(row.get(field))
+            values['updated_at'] = now
+            rows.append(values)
+            genres[key] = parse_genres(row.get('genres'))
+        if not rows:
+            continue
+
+        genre_ids = resolve_genre_ids(
+            {name for names in genres.values() for name in names})
+        db.session.execute(model.__table__.insert(), rows)
+
+        # read the new ids back by natural key
+        inserted = db.session.query(model.id, model.name, model.city, model.state) \
+            .filter(db.tuple_(model.name, model.city, model.state).in_(list(genres)))
+        for id, name, city, state in inserted:
+            keys[(name, city, state)] = id
+
+        links = [{owner_column: keys[key], 'genre_id': genre_ids[name]}
+                 for key, names in genres.items() for name in dict.fromkeys(names)]
+        if links:
+            db.session.execute(association.insert(), links)
+        log_index_changes(db.session.connection(), model.__tablename__,
+                          [keys[key] for key in genres])
+        db.session.commit()
+        stats.inserted += len(rows)
+    return stats
+
+
+def import_venues(path, batch_size):
+    return import_entities(Venue, VENUE_FIELDS, venue_genres, 'venue_id', path, batch_size)
+
+
+def import_artists(path, batch_size):
+    return import_entities(Artist, ARTIST_FIELDS, artist_genres, 'artist_id', path, batch_size)
+
+
+# the id of the venue or artist a show row refers to, or None when it names
+# none that exists, so the row is skipped rather than failing the batch on
+# the foreign key (or leaving an orphan where foreign keys are not enforced)
+def resolve_reference(row, kind, keys, ids):
+    id = row.get(kind + '_id')
+    if id not in (None, ''):
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            return None
+        return id if id in ids else None
+    try:
+        return keys.get(natural_key(row, kind + '_'))
+    except KeyError:
+        return None
+
+
+def copy_shows(rows):
+    # COPY is several times faster than INSERT for large batches
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row['artist_id'], row['venue_id'], row['start_time'].isoformat(),
+                         row['end_time'].isoformat(), row['updated_at'].isoformat()))
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY "Show" (artist_id, venue_id, start_time, end_time, updated_at) '
+        'FROM STDIN WITH (FORMAT csv)',
+        buffer)
+
+
+def add_show_counts(rows):
+    # Core inserts skip the ORM events that maintain the show counters
+    now = datetime.now()
+    counts = {'venue_id': {}, 'artist_id': {}}
+    for row in rows:
+        upcoming = row['start_time'] > now
+        for column, owner_counts in counts.items():
+            current = owner_counts.get(row[column], (0, 0))
+            owner_counts[row[column]] = (current[0] + upcoming, current[1] + (not upcoming))
+    connection = db.session.connection()
+    counters.add_counts(connection, Venue, counts['venue_id'])
+    counters.add_counts(connection, Artist, counts['artist_id'])
+
+
+def import_shows(path, batch_size):
+    stats = ImportStats('shows')
+    venue_keys = load_keys(Venue)
+    artist_keys = load_keys(Artist)
+    venue_ids = set(venue_keys.values())
+    artist_ids = set(artist_keys.values())
+    use_copy = db.engine.dialect.name == 'postgresql'
+    now = datetime.utcnow()
+
+    for batch in batches(read_rows(path), batch_size):
+        rows = []
+        for row in batch:
+            venue_id = resolve_reference(row, 'venue', venue_keys, venue_ids)
+            artist_id = resolve_reference(row, 'artist', artist_keys, artist_ids)
+            if venue_id is None or artist_id is None or not row.get('start_time'):
+                stats.skipped += 1
+                continue
+            try:
+                start_time = parse_datetime(row['start_time'])
+                end_time = parse_datetime(row['end_time']) if row.get('end_time') \
+                    else start_time + DEFAULT_SHOW_DURATION
+            except (TypeError, ValueError, OverflowError):
+                stats.skipped += 1
+                continue
+            if end_time <= start_time:
+                stats.skipped += 1
+                continue
+            rows.append({
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'end_time': end_time,
+                'updated_at': now
+            })
+        if not rows:
+            continue
+
+        if use_copy:
+            copy_shows(rows)
+        else:
+            db.session.execute(Show.__table__.insert(), rows)
+        add_show_counts(rows)
+        # the venues and artists whose autocomplete ranks the new shows change
+        connection = db.session.connection()
+        log_index_changes(connection, Venue.__tablename__, [row['venue_id'] for row in rows])
+        log_index_changes(connection, Artist.__tablename__, [row['artist_id'] for row in rows])
+        db.session.commit()
+        stats.inserted += len(rows)
+    return stats
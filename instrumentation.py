@@ -0,0 +1,144 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import os
+import re
+import time
+from logging import Formatter, FileHandler
+from flask import current_app, g, has_request_context, request, signals_available
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+# Every request records how many statements it ran, the time spent in the
+# database and the time spent rendering templates. The numbers go out in a
+# Server-Timing header, which browser dev tools show next to the request,
+# and as one JSON line per request in REQUEST_LOG. Statements slower than
+# SLOW_QUERY_MS are written to SLOW_QUERY_LOG with their literals replaced
+# by ? and the view that ran them.
+#
+# Streamed responses (the export API) keep querying after the headers are
+# sent; their numbers only cover the work done before the first byte.
+#----------------------------------------------------------------------------#
+
+request_log = logging.getLogger('fyyur.requests')
+slow_query_log = logging.getLogger('fyyur.slow_queries')
+
+PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+PLACEHOLDER_LISTS = re.compile(rf'\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})+\s*\)')
+STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERALS = re.compile(r'\b\d+(?:\.\d+)?\b')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    # one line per statement shape, whatever its literals or IN list sizes
+    statement = STRING_LITERALS.sub('?', statement)
+    statement = NUMBER_LITERALS.sub('?', statement)
+    statement = WHITESPACE.sub(' ', statement).strip()
+    return PLACEHOLDER_LISTS.sub('(?, ...)', statement)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+    if not has_request_context() or 'sql_count' not in g:
+        return
+    g.sql_count += 1
+    g.sql_time += elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_MS')
+    if threshold is not None and elapsed * 1000 >= threshold:
+        slow_query_log.warning(json.dumps({
+            'duration_ms': round(elapsed * 1000, 1),
+            'view': request.endpoint,
+            'statement': normalize(statement),
+        }))
+
+
+# a failed statement never reaches after_cursor_execute
+@event.listens_for(Engine, 'handle_error')
+def drop_statement(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('statement_started'):
+        connection.info['statement_started'].pop()
+
+
+def start_template(sender, template, context, **extra):
+    if 'template_started' in g:
+        g.template_started.append(time.perf_counter())
+
+
+def end_template(sender, template, context, **extra):
+    if g.get('template_started'):
+        g.template_time += time.perf_counter() - g.template_started.pop()
+
+
+# relative paths are taken from the instance folder, which git ignores
+def log_to_file(logger, app, path):
+    path = os.path.join(app.instance_path, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = FileHandler(path)
+    handler.setFormatter(Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    if app.config.get('REQUEST_LOG'):
+        log_to_file(request_log, app, app.config['REQUEST_LOG'])
+    if app.config.get('SLOW_QUERY_LOG'):
+        log_to_file(slow_query_log, app, app.config['SLOW_QUERY_LOG'])
+
+    # template timing needs blinker for Flask's signals
+    if signals_available:
+        before_render_template.connect(start_template, app)
+        template_rendered.connect(end_template, app)
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.template_started = []
+        g.template_time = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        total = (time.perf_counter() - g.request_started) * 1000
+        db_time = g.sql_time * 1000
+        template_time = g.template_time * 1000
+
+        timings = [f'db;dur={db_time:.1f};desc="{g.sql_count} queries"']
+        if signals_available:
+            timings.append(f'tpl;dur={template_time:.1f}')
+        timings.append(f'total;dur={total:.1f}')
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        request_log.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': request.endpoint,
+            'status': response.status_code,
+            'queries': g.sql_count,
+            'db_ms': round(db_time, 1),
+            'template_ms': round(template_time, 1),
+            'total_ms': round(total, 1),
+        }))
+        return response
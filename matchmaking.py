@@ -0,0 +1,286 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from scipy import sparse
+from geo import EARTH_RADIUS_KM
+from models import (db, Genre, Venue, Artist, Show, venue_genres, artist_genres,
+                    venue_matches, artist_matches, matches_refreshed)
+
+#----------------------------------------------------------------------------#
+# Matchmaking.
+#
+# Pairs artists seeking venues with venues seeking talent. A pair scores
+#
+#   GENRE_WEIGHT     the cosine similarity of their genres
+#   LOCATION_WEIGHT  1 in the same city, else falling from 1 to 0 as they
+#                    get LOCATION_RADIUS_KM apart
+#   HISTORY_WEIGHT   1 - 1 / (1 + shows the artist has played there)
+#
+# and only pairs sharing a genre or a past show are candidates, so scores
+# stay sparse. Genres are (entities x genres) sparse matrices with unit
+# rows, and the genre term of a block of one side against the whole other
+# side is one sparse product. Blocks are scored in a process pool and only
+# each entity's best MATCHES_PER_ENTITY are kept, in artist_matches and
+# venue_matches.
+#
+# `flask matches` rescores the venues and artists updated since its last
+# run (their genres, seeking flags or location may have changed) and the
+# lists they enter or leave; `flask matches --full` rescores everyone and
+# is the only one to count shows played since, so run it e.g. nightly. A
+# deleted venue or artist takes its rows along through ON DELETE CASCADE,
+# leaving the lists that held it one short until the next full run.
+#----------------------------------------------------------------------------#
+
+GENRE_WEIGHT = 0.5
+LOCATION_WEIGHT = 0.3
+HISTORY_WEIGHT = 0.2
+LOCATION_RADIUS_KM = 100
+# rows of one side scored per task
+BLOCK_SIZE = 256
+# an incremental run touching more of a side than this rescores everyone
+FULL_REFRESH_FRACTION = 0.1
+
+# the seeking venues or artists, in id order, with their unit genre rows,
+# city codes and coordinates in radians (NaN when not located)
+Side = namedtuple('Side', 'ids genres cities points')
+
+# kind -> (model, seeking flag, genre links, their owner column, matches)
+KINDS = {
+    'artist': (Artist, Artist.seeking_venue, artist_genres, artist_genres.c.artist_id,
+               artist_matches),
+    'venue': (Venue, Venue.seeking_talent, venue_genres, venue_genres.c.venue_id,
+              venue_matches),
+}
+OTHER = {'artist': 'venue', 'venue': 'artist'}
+
+
+def positions(ids, values):
+    # where values sit in the sorted ids, and which of them are there at all
+    values = np.asarray(values, dtype=np.int64)
+    found = np.searchsorted(ids, values)
+    found[found == len(ids)] = 0
+    present = ids[found] == values if len(ids) else np.zeros(len(values), bool)
+    return found, present
+
+
+def load_side(kind, genre_count, city_codes):
+    model, seeking, association, owner_column, _ = KINDS[kind]
+    rows = db.session.query(model.id, model.city, model.state, model.latitude,
+                            model.longitude) \
+        .filter(seeking.is_(True)).order_by(model.id).all()
+    ids = np.array([row.id for row in rows], dtype=np.int64)
+    cities = np.array([city_codes.setdefault((row.city.strip().casefold(), row.state),
+                                             len(city_codes)) for row in rows],
+                      dtype=np.int64)
+    points = np.radians(np.array(
+        [(np.nan if row.latitude is None else row.latitude,
+          np.nan if row.longitude is None else row.longitude) for row in rows],
+        dtype=np.float64).reshape(-1, 2))
+
+    links = np.array(db.session.query(owner_column, association.c.genre_id)
+                     .join(model, model.id == owner_column)
+                     .filter(seeking.is_(True)).all(), dtype=np.int64).reshape(-1, 2)
+    owners, present = positions(ids, links[:, 0])
+    owners, genre_ids = owners[present], links[present, 1]
+    # unit rows, so the product of two rows is their cosine similarity
+    per_owner = np.bincount(owners, minlength=len(ids))
+    values = 1 / np.sqrt(per_owner[owners])
+    genres = sparse.csr_matrix((values, (owners, genre_ids)),
+                               shape=(len(ids), genre_count))
+    return Side(ids, genres, cities, points)
+
+
+# (artists x venues) affinities from the shows already played
+def load_history(artists, venues):
+    rows = np.array(db.session.query(Show.artist_id, Show.venue_id, db.func.count(Show.id))
+                    .filter(Show.start_time <= datetime.now())
+                    .group_by(Show.artist_id, Show.venue_id).all(),
+                    dtype=np.int64).reshape(-1, 3)
+    artist_rows, artist_present = positions(artists.ids, rows[:, 0])
+    venue_rows, venue_present = positions(venues.ids, rows[:, 1])
+    present = artist_present & venue_present
+    return sparse.csr_matrix((1 - 1 / (1 + rows[present, 2]),
+                              (artist_rows[present], venue_rows[present])),
+                             shape=(len(artists.ids), len(venues.ids)))
+
+
+def load():
+    genre_count = (db.session.query(db.func.max(Genre.id)).scalar() or 0) + 1
+    city_codes = {}
+    artists = load_side('artist', genre_count, city_codes)
+    venues = load_side('venue', genre_count, city_codes)
+    return artists, venues, load_history(artists, venues)
+
+#----------------------------------------------------------------------------#
+# Scoring.
+#----------------------------------------------------------------------------#
+
+
+def closeness(left, right, rows, columns):
+    lat1, lng1 = left.points[rows].T
+    lat2, lng2 = right.points[columns].T
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    # NaN where either side has no coordinates
+    near = np.nan_to_num(np.clip(1 - distance / LOCATION_RADIUS_KM, 0, 1))
+    return np.maximum(left.cities[rows] == right.cities[columns], near)
+
+
+# scores the given rows of left against every candidate of right, and
+# returns (row positions, column positions, scores): each row's best limit
+# matches, best first, or every candidate when limit is None
+def score_rows(left, right, history, rows, limit):
+    scores = (GENRE_WEIGHT * (left.genres[rows] @ right.genres.T) +
+              HISTORY_WEIGHT * history[rows]).tocoo()
+    i, j = scores.row, scores.col
+    scores = scores.data + LOCATION_WEIGHT * closeness(left, right, rows[i], j)
+    if limit is not None:
+        # by row, then best first; ties go to the lower id
+        order = np.lexsort((j, -scores, i))
+        i, j, scores = i[order], j[order], scores[order]
+        rank = np.arange(len(i)) - np.searchsorted(i, i)
+        keep = rank < limit
+        i, j, scores = i[keep], j[keep], scores[keep]
+    return rows[i], j, scores
+
+
+def blocks(rows):
+    return [block for block in np.array_split(rows, -(-len(rows) // BLOCK_SIZE) or 1)
+            if len(block)]
+
+
+# the sides a worker scores against, set once per process by start_worker()
+# so tasks only carry row numbers
+sides = {}
+
+
+def start_worker(artists, venues, history):
+    sides['artist'] = (artists, venues, history)
+    sides['venue'] = (venues, artists, history.T.tocsr())
+
+
+def score_task(task):
+    kind, rows, limit = task
+    left, right, history = sides[kind]
+    found_rows, found_columns, scores = score_rows(left, right, history, rows, limit)
+    return kind, left.ids[found_rows], right.ids[found_columns], scores
+
+
+# yields score_task() results for rows {kind: positions}, in a pool of
+# workers processes unless there is only one or only one block
+def score(artists, venues, history, rows, limit, workers):
+    tasks = [(kind, block, limit) for kind, kind_rows in rows.items()
+             for block in blocks(kind_rows)]
+    if workers <= 1 or len(tasks) <= 1:
+        start_worker(artists, venues, history)
+        yield from map(score_task, tasks)
+        return
+    with ProcessPoolExecutor(workers, initializer=start_worker,
+                             initargs=(artists, venues, history)) as pool:
+        yield from pool.map(score_task, tasks)
+
+#----------------------------------------------------------------------------#
+# Refreshing the stored matches.
+#----------------------------------------------------------------------------#
+
+
+def updated_since(kind, since):
+    model = KINDS[kind][0]
+    return db.select(model.id).where(model.updated_at >= since)
+
+
+# rows of the other side whose stored list an update of kind may change:
+# the lists holding an updated entity, which may have dropped out, and
+# those a changed entity now scores at least as high as the last entry of
+# (ties go to the lower id)
+def affected(kind, left, right, history, changed, since, limit):
+    other = OTHER[kind]
+    matches = KINDS[other][4]
+    owner, match = matches.c[other + '_id'], matches.c[kind + '_id']
+
+    holding = db.session.execute(db.select(owner).distinct()
+                                 .where(match.in_(updated_since(kind, since)))).scalars().all()
+    found, present = positions(right.ids, holding)
+    rows = set(found[present].tolist())
+
+    # the score to beat for each list, -inf for lists with room left
+    threshold = np.full(len(right.ids), -np.inf)
+    full_lists = db.session.execute(db.select(owner, db.func.min(matches.c.score))
+                                    .group_by(owner)
+                                    .having(db.func.count() >= limit)).all()
+    if full_lists:
+        owners, scores = zip(*full_lists)
+        found, present = positions(right.ids, owners)
+        threshold[found[present]] = np.array(scores)[present]
+    best = np.full(len(right.ids), -np.inf)
+    for block in blocks(changed):
+        _, columns, scores = score_rows(left, right, history, block, None)
+        np.maximum.at(best, columns, scores)
+    rows.update(np.flatnonzero(best >= threshold).tolist())
+    return np.array(sorted(rows), dtype=np.int64)
+
+
+def store(matches, kind, owner_ids, match_ids, scores):
+    other = OTHER[kind]
+    if len(owner_ids):
+        db.session.execute(matches.insert(), [
+            {kind + '_id': owner, other + '_id': match, 'score': score}
+            for owner, match, score in zip(owner_ids.tolist(), match_ids.tolist(),
+                                           scores.tolist())])
+
+
+# rescores the seeking artists and venues that need it and stores their top
+# limit matches; returns ({kind: entities rescored}, whether it was a full run)
+def refresh(limit, workers=None, full=False):
+    workers = workers or os.cpu_count() or 1
+    # updated_at is UTC
+    now = datetime.utcnow()
+    since = db.session.execute(db.select(matches_refreshed.c.refreshed_at)).scalar()
+    artists, venues, history = load()
+    loaded = {'artist': (artists, venues, history), 'venue': (venues, artists, history.T.tocsr())}
+
+    rows = {}
+    if since is not None and not full:
+        for kind, (left, _, _) in loaded.items():
+            updated = db.session.execute(updated_since(kind, since)).scalars().all()
+            found, present = positions(left.ids, updated)
+            rows[kind] = np.unique(found[present])
+        full = any(len(rows[kind]) > FULL_REFRESH_FRACTION * len(loaded[kind][0].ids)
+                   for kind in rows)
+    if since is None or full:
+        full = True
+        rows = {kind: np.arange(len(left.ids)) for kind, (left, _, _) in loaded.items()}
+        for kind in KINDS:
+            db.session.execute(KINDS[kind][4].delete())
+    else:
+        changed = dict(rows)
+        for kind, (left, right, kind_history) in loaded.items():
+            other = OTHER[kind]
+            rows[other] = np.union1d(rows[other], affected(
+                kind, left, right, kind_history, changed[kind], since, limit))
+        for kind, (left, _, _) in loaded.items():
+            matches = KINDS[kind][4]
+            owner = matches.c[kind + '_id']
+            # updated entities may have stopped seeking: drop their lists too
+            db.session.execute(matches.delete().where(owner.in_(updated_since(kind, since))))
+            if len(rows[kind]):
+                db.session.execute(matches.delete().where(owner == db.bindparam('owner_id')),
+                                   [{'owner_id': id} for id in left.ids[rows[kind]].tolist()])
+
+    for kind, owner_ids, match_ids, scores in score(artists, venues, history, rows,
+                                                    limit, workers):
+        store(KINDS[kind][4], kind, owner_ids, match_ids, scores)
+
+    if since is None:
+        db.session.execute(matches_refreshed.insert().values(id=1, refreshed_at=now))
+    else:
+        db.session.execute(matches_refreshed.update().values(refreshed_at=now))
+    db.session.commit()
+    return {kind: len(kind_rows) for kind, kind_rows in rows.items()}, full
@@ -0,0 +1,34 @@
+"""log venue and artist changes for the search indexes of other processes
+
+Revision ID: 3b8f1d6a9e25
+Revises: 9f2b6d4e7c18
+Create Date: 2026-10-19 11:26:04.517932
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8f1d6a9e25'
+down_revision = '9f2b6d4e7c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'index_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=64), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_index_changes_changed_at'), 'index_changes', ['changed_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_index_changes_changed_at'), table_name='index_changes')
+    op.drop_table('index_changes')
@@ -0,0 +1,65 @@
+"""add indexes for show, genre, venue and artist lookups
+
+Revision ID: 5b7e2c9a4d13
+Revises: 1eba657a941f
+Create Date: 2026-10-18 10:12:41.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9a4d13'
+down_revision = '1eba657a941f'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], False),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], False),
+    ('ix_Show_start_time', 'Show', ['start_time', 'id'], False),
+    ('ix_Genre_name', 'Genre', ['name'], True),
+    ('ix_Venue_state_city', 'Venue', ['state', 'city'], False),
+    ('ix_Artist_state_city', 'Artist', ['state', 'city'], False),
+]
+
+
+def merge_duplicate_genres():
+    # the unique index on Genre.name cannot be built while concurrent form
+    # submissions have left duplicate names behind, so fold every duplicate
+    # into the lowest id first
+    conn = op.get_bind()
+    canonical = {}
+    for id, name in conn.execute(sa.text('SELECT id, name FROM "Genre" ORDER BY id')):
+        if name not in canonical:
+            canonical[name] = id
+            continue
+        keep = canonical[name]
+        for table, owner in (('venue_genres', 'venue_id'), ('artist_genres', 'artist_id')):
+            conn.execute(sa.text(
+                f'DELETE FROM {table} WHERE genre_id = :dup AND {owner} IN '
+                f'(SELECT {owner} FROM {table} WHERE genre_id = :keep)'),
+                {'dup': id, 'keep': keep})
+            conn.execute(sa.text(
+                f'UPDATE {table} SET genre_id = :keep WHERE genre_id = :dup'),
+                {'dup': id, 'keep': keep})
+        conn.execute(sa.text('DELETE FROM "Genre" WHERE id = :dup'), {'dup': id})
+
+
+def upgrade():
+    merge_duplicate_genres()
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; on
+    # PostgreSQL this keeps the tables writable while the indexes build
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True)
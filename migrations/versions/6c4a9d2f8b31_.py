@@ -0,0 +1,32 @@
+"""drop the table versions, the listing validators count rows again
+
+Revision ID: 6c4a9d2f8b31
+Revises: 3b8f1d6a9e25
+Create Date: 2026-10-19 14:08:51.662410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c4a9d2f8b31'
+down_revision = '3b8f1d6a9e25'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('Artist', 'Show', 'Venue')
+
+
+def upgrade():
+    op.drop_table('table_versions')
+
+
+def downgrade():
+    table_versions = op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': name, 'version': 0} for name in VERSIONED_TABLES])
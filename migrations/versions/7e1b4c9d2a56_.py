@@ -0,0 +1,34 @@
+"""log deleted venues, artists and shows for the incremental exports
+
+Revision ID: 7e1b4c9d2a56
+Revises: 6c4a9d2f8b31
+Create Date: 2026-10-19 16:42:17.208356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1b4c9d2a56'
+down_revision = '6c4a9d2f8b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'deletions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=64), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deletions_table_name_deleted_at', 'deletions',
+                    ['table_name', 'deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_deletions_table_name_deleted_at', table_name='deletions')
+    op.drop_table('deletions')
@@ -0,0 +1,31 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: 8d41f0b6e2a7
+Revises: 5b7e2c9a4d13
+Create Date: 2026-10-18 11:02:17.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0b6e2a7'
+down_revision = '5b7e2c9a4d13'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.func.now()))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,34 @@
+"""index lowercased venue and artist names for autocomplete
+
+Revision ID: 9f2b6d4e7c18
+Revises: c5d1e8a3f604
+Create Date: 2026-10-19 10:02:51.093344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2b6d4e7c18'
+down_revision = 'c5d1e8a3f604'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist']
+
+
+def upgrade():
+    # prefix LIKEs only use a PostgreSQL index in text_pattern_ops order
+    # unless the database collation is C
+    if op.get_bind().dialect.name == 'postgresql':
+        expression = 'lower(name) text_pattern_ops'
+    else:
+        expression = 'lower(name)'
+    for table in TABLES:
+        op.create_index(f'ix_{table}_lower_name', table, [sa.text(expression)], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_lower_name', table_name=table)
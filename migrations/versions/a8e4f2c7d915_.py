@@ -0,0 +1,49 @@
+"""store the best matches of seeking venues and artists
+
+Revision ID: a8e4f2c7d915
+Revises: f3c9b1e7a2d4
+Create Date: 2026-10-18 21:14:09.835620
+
+The tables stay empty until the first `flask matches` run.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e4f2c7d915'
+down_revision = 'f3c9b1e7a2d4'
+branch_labels = None
+depends_on = None
+
+# (table, owner column, owner table, match column, match table)
+TABLES = [('artist_matches', 'artist_id', 'Artist', 'venue_id', 'Venue'),
+          ('venue_matches', 'venue_id', 'Venue', 'artist_id', 'Artist')]
+
+
+def upgrade():
+    for table, owner, owner_table, match, match_table in TABLES:
+        op.create_table(
+            table,
+            sa.Column(owner, sa.Integer(), nullable=False),
+            sa.Column(match, sa.Integer(), nullable=False),
+            sa.Column('score', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint([owner], [f'{owner_table}.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint([match], [f'{match_table}.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint(owner, match)
+        )
+        op.create_index(f'ix_{table}_{match}', table, [match], unique=False)
+    op.create_table(
+        'matches_refreshed',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('matches_refreshed')
+    for table, _, _, match, _ in reversed(TABLES):
+        op.drop_index(f'ix_{table}_{match}', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,51 @@
+"""add Show.end_time and refuse overlapping bookings
+
+Revision ID: b4e8d2f61a37
+Revises: e6f3a1c8d952
+Create Date: 2026-10-18 19:02:37.118406
+
+Existing shows are given the default two hour duration. On PostgreSQL the
+upgrade fails, and rolls back, if two of them then overlap for the same
+venue or artist; the error names the pair to move or delete first.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8d2f61a37'
+down_revision = 'e6f3a1c8d952'
+branch_labels = None
+depends_on = None
+
+# kept in step with models.SHOW_EXCLUSION_CONSTRAINTS
+EXCLUSION_CONSTRAINTS = [('ex_Show_venue_overlap', 'venue_id'),
+                         ('ex_Show_artist_overlap', 'artist_id')]
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    if postgresql:
+        op.execute('UPDATE "Show" SET end_time = start_time + interval \'2 hours\'')
+    else:
+        op.execute('UPDATE "Show" SET end_time = datetime(start_time, \'+2 hours\')')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_after_start', 'end_time > start_time')
+
+    if postgresql:
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for name, column in EXCLUSION_CONSTRAINTS:
+            op.execute(f'ALTER TABLE "Show" ADD CONSTRAINT "{name}" EXCLUDE USING gist '
+                       f'({column} WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, _ in EXCLUSION_CONSTRAINTS:
+            op.drop_constraint(name, 'Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('ck_Show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
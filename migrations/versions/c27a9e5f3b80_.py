@@ -0,0 +1,52 @@
+"""add upcoming/past show counters to Venue and Artist
+
+Revision ID: c27a9e5f3b80
+Revises: 8d41f0b6e2a7
+Create Date: 2026-10-18 12:20:44.517392
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27a9e5f3b80'
+down_revision = '8d41f0b6e2a7'
+branch_labels = None
+depends_on = None
+
+OWNERS = [('Venue', 'venue_id'), ('Artist', 'artist_id')]
+
+
+def upgrade():
+    op.create_table('show_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    for table, _ in OWNERS:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+
+    # backfill; the app compares start_time with its local time
+    now = datetime.now()
+    for table, column in OWNERS:
+        op.execute(sa.text(
+            f'UPDATE "{table}" SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM "Show" '
+            f'WHERE "Show".{column} = "{table}".id AND "Show".start_time > :now), '
+            f'past_shows_count = (SELECT count(*) FROM "Show" '
+            f'WHERE "Show".{column} = "{table}".id AND "Show".start_time <= :now)'
+        ).bindparams(now=now))
+    op.execute(sa.text('INSERT INTO show_counters (id, refreshed_at) VALUES (1, :now)')
+               .bindparams(now=now))
+
+
+def downgrade():
+    for table, _ in reversed(OWNERS):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_table('show_counters')
@@ -0,0 +1,32 @@
+"""add table versions for the listing validators
+
+Revision ID: c5d1e8a3f604
+Revises: a8e4f2c7d915
+Create Date: 2026-10-19 09:12:37.418206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d1e8a3f604'
+down_revision = 'a8e4f2c7d915'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('Artist', 'Show', 'Venue')
+
+
+def upgrade():
+    table_versions = op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,27 @@
+"""index genre links by genre for the genre filters
+
+Revision ID: d7a2c5e9f341
+Revises: b4e8d2f61a37
+Create Date: 2026-10-18 19:48:05.602117
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2c5e9f341'
+down_revision = 'b4e8d2f61a37'
+branch_labels = None
+depends_on = None
+
+TABLES = [('venue_genres', 'venue_id'), ('artist_genres', 'artist_id')]
+
+
+def upgrade():
+    for table, column in TABLES:
+        op.create_index(f'ix_{table}_genre_id', table, ['genre_id', column], unique=False)
+
+
+def downgrade():
+    for table, _ in reversed(TABLES):
+        op.drop_index(f'ix_{table}_genre_id', table_name=table)
@@ -0,0 +1,41 @@
+"""cascade deletes from Venue and Artist to shows and genre links
+
+Revision ID: e6f3a1c8d952
+Revises: c27a9e5f3b80
+Create Date: 2026-10-18 13:05:09.226871
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f3a1c8d952'
+down_revision = 'c27a9e5f3b80'
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table), named as PostgreSQL named the
+# original unnamed constraints
+FOREIGN_KEYS = [
+    ('Show', 'venue_id', 'Venue'),
+    ('Show', 'artist_id', 'Artist'),
+    ('venue_genres', 'venue_id', 'Venue'),
+    ('venue_genres', 'genre_id', 'Genre'),
+    ('artist_genres', 'artist_id', 'Artist'),
+    ('artist_genres', 'genre_id', 'Genre'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
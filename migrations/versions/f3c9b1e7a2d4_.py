@@ -0,0 +1,35 @@
+"""add venue and artist coordinates for radius searches
+
+Revision ID: f3c9b1e7a2d4
+Revises: d7a2c5e9f341
+Create Date: 2026-10-18 20:31:44.270913
+
+Existing rows have no coordinates until `flask geocode` or an edit of the
+venue gives them some.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9b1e7a2d4'
+down_revision = 'd7a2c5e9f341'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('latitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_Venue_latitude_longitude', 'Venue', ['latitude', 'longitude'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_latitude_longitude', table_name='Venue')
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
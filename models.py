@@ -2,29 +2,33 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-from flask import Flask
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.engine import Engine
+import sqlite3
+from database import RoutingSQLAlchemy
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Extensions.
+#
+# Bound to an app by create_app() in app.py, which also sets up
+# Flask-Migrate when MIGRATIONS_ENABLED.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# how long a show runs when it is listed without an end time
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
 
 class Genre(db.Model):
     __tablename__ = 'Genre'
+    __table_args__ = (
+        db.Index('ix_Genre_name', 'name', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -33,36 +37,109 @@ class Genre(db.Model):
 # Venue and Genre -> many2many
 venue_genres = db.Table('venue_genres',
                         db.Column('venue_id', db.Integer, db.ForeignKey(
-                            'Venue.id'), primary_key=True),
-                        db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True))
+                            'Venue.id', ondelete='CASCADE'), primary_key=True),
+                        db.Column('genre_id', db.Integer, db.ForeignKey(
+                            'Genre.id', ondelete='CASCADE'), primary_key=True),
+                        # genre filters on /venues start from the genre
+                        db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id'))
 
 # Artist and Genre -> many2many
 artist_genres = db.Table('artist_genres',
                          db.Column('artist_id', db.Integer, db.ForeignKey(
-                             'Artist.id'), primary_key=True),
-                         db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True))
+                             'Artist.id', ondelete='CASCADE'), primary_key=True),
+                         db.Column('genre_id', db.Integer, db.ForeignKey(
+                             'Genre.id', ondelete='CASCADE'), primary_key=True),
+                         db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id'))
+
+# single row: when the show counters last moved started shows to the past
+show_counters = db.Table('show_counters',
+                         db.Column('id', db.Integer, primary_key=True),
+                         db.Column('refreshed_at', db.DateTime, nullable=False))
+
+# the best venues for each seeking artist and the best artists for each
+# seeking venue, written by `flask matches` (see matchmaking.py). Each side
+# keeps its own top MATCHES_PER_ENTITY, so a pair may be listed on one side
+# only
+artist_matches = db.Table('artist_matches',
+                          db.Column('artist_id', db.Integer, db.ForeignKey(
+                              'Artist.id', ondelete='CASCADE'), primary_key=True),
+                          db.Column('venue_id', db.Integer, db.ForeignKey(
+                              'Venue.id', ondelete='CASCADE'), primary_key=True),
+                          db.Column('score', db.Float, nullable=False),
+                          # deletes cascading from a venue start from the venue
+                          db.Index('ix_artist_matches_venue_id', 'venue_id'))
+
+venue_matches = db.Table('venue_matches',
+                         db.Column('venue_id', db.Integer, db.ForeignKey(
+                             'Venue.id', ondelete='CASCADE'), primary_key=True),
+                         db.Column('artist_id', db.Integer, db.ForeignKey(
+                             'Artist.id', ondelete='CASCADE'), primary_key=True),
+                         db.Column('score', db.Float, nullable=False),
+                         db.Index('ix_venue_matches_artist_id', 'artist_id'))
+
+# single row: the updated_at up to which `flask matches` has seen changes
+matches_refreshed = db.Table('matches_refreshed',
+                             db.Column('id', db.Integer, primary_key=True),
+                             db.Column('refreshed_at', db.DateTime, nullable=False))
+
+# the venues and artists each transaction changed, written with it, for
+# every process to read back into its own search indexes (see
+# search_index.IndexSync). Rows older than SEARCH_INDEX_CHANGES_KEEP_HOURS
+# are deleted as they are read
+index_changes = db.Table('index_changes',
+                         db.Column('id', db.Integer, primary_key=True),
+                         db.Column('table_name', db.String(64), nullable=False),
+                         db.Column('row_id', db.Integer, nullable=False),
+                         db.Column('changed_at', db.DateTime, nullable=False,
+                                   default=datetime.utcnow, index=True))
+
+# venues, artists and shows as they are deleted, kept for the incremental
+# exports (/api/venues?since=...) to report; see record_deletion() below
+deletions = db.Table('deletions',
+                     db.Column('id', db.Integer, primary_key=True),
+                     db.Column('table_name', db.String(64), nullable=False),
+                     db.Column('row_id', db.Integer, nullable=False),
+                     db.Column('deleted_at', db.DateTime, nullable=False,
+                               default=datetime.utcnow),
+                     db.Index('ix_deletions_table_name_deleted_at',
+                              'table_name', 'deleted_at'))
 
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        # radius searches read a latitude range, see geo.query_near
+        db.Index('ix_Venue_latitude_longitude', 'latitude', 'longitude'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
+    # WGS 84 degrees, from the venue forms or `flask geocode`
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(250))
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
 
     # many2many
     genres = db.relationship(
-        'Genre', secondary=venue_genres, backref=db.backref('venues', lazy=True))
-    # one2many
-    shows = db.relationship('Show', backref='venue', lazy=True)
+        'Genre', secondary=venue_genres, backref=db.backref('venues', lazy=True),
+        passive_deletes=True)
+    # one2many; shows and genre links are removed by ON DELETE CASCADE
+    shows = db.relationship('Show', backref='venue', lazy=True, passive_deletes=True)
 
     def __repr__(self):
         return f'<Venue {self.id} name: {self.name}>'
@@ -70,37 +147,143 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_state_city', 'state', 'city'),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
+    # where the artist's city is, from `flask geocode`
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(250))
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
 
     # many2many
     genres = db.relationship(
-        'Genre', secondary=artist_genres, backref=db.backref('artists', lazy=True))
-    # one2many
-    shows = db.relationship('Show', backref='artist', lazy=True)
+        'Genre', secondary=artist_genres, backref=db.backref('artists', lazy=True),
+        passive_deletes=True)
+    # one2many; shows and genre links are removed by ON DELETE CASCADE
+    shows = db.relationship('Show', backref='artist', lazy=True, passive_deletes=True)
 
     def __repr__(self):
         return f'<Artist {self.id} name: {self.name}>'
 
 
+# /api/autocomplete matches lower(name) LIKE 'prefix%' until its index is
+# built; text_pattern_ops lets PostgreSQL seek those whatever the collation
+db.Index('ix_Venue_lower_name', db.func.lower(Venue.name).label('lower_name'),
+         postgresql_ops={'lower_name': 'text_pattern_ops'})
+db.Index('ix_Artist_lower_name', db.func.lower(Artist.name).label('lower_name'),
+         postgresql_ops={'lower_name': 'text_pattern_ops'})
+
+
+# a show books its venue and artist for [start_time, end_time); see
+# bookings.py for how overlapping bookings are kept out
+def default_end_time(context):
+    # also applies to Core inserts, which only pass start_time
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
+
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # covers the (start_time, id) keyset ordering of /shows
+        db.Index('ix_Show_start_time', 'start_time', 'id'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False,
                            default=datetime.utcnow)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
 
     def __repr__(self):
         return f'<Show {self.id} artist {self.artist_id} venue {self.venue_id}>'
+
+
+# PostgreSQL refuses overlapping bookings itself, which also covers two
+# requests booking the same slot at once. Created here for db.create_all();
+# the migration adds them to existing databases
+SHOW_EXCLUSION_CONSTRAINTS = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_overlap" EXCLUDE USING gist '
+    '(venue_id WITH =, tsrange(start_time, end_time) WITH &&)',
+    'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_artist_overlap" EXCLUDE USING gist '
+    '(artist_id WITH =, tsrange(start_time, end_time) WITH &&)',
+]
+for statement in SHOW_EXCLUSION_CONSTRAINTS:
+    db.event.listen(Show.__table__, 'after_create',
+                    db.DDL(statement).execute_if(dialect='postgresql'))
+
+
+# onupdate only fires when a column of the row itself changes; touch venues
+# and artists whose genres changed too so their pages revalidate
+@db.event.listens_for(db.session, 'before_flush')
+def touch_updated_at(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            obj.updated_at = datetime.utcnow()
+
+
+# deletes are recorded in the same transaction. Shows removed by ON DELETE
+# CASCADE fire no events, so their venue or artist records them on its
+# way out, in one INSERT ... SELECT
+@db.event.listens_for(Venue, 'before_delete')
+@db.event.listens_for(Artist, 'before_delete')
+def record_cascaded_deletions(mapper, connection, target):
+    owner_column = Show.venue_id if isinstance(target, Venue) else Show.artist_id
+    connection.execute(deletions.insert().from_select(
+        ['table_name', 'row_id', 'deleted_at'],
+        db.select(db.literal(Show.__tablename__), Show.id, db.literal(datetime.utcnow()))
+        .where(owner_column == target.id)))
+
+
+@db.event.listens_for(Venue, 'after_delete')
+@db.event.listens_for(Artist, 'after_delete')
+@db.event.listens_for(Show, 'after_delete')
+def record_deletion(mapper, connection, target):
+    connection.execute(deletions.insert().values(table_name=target.__tablename__,
+                                                 row_id=target.id))
+
+
+# flushes log the rows they change through search_index.log_changes(); Core
+# statements (`flask import`, `flask geocode`) log theirs themselves
+def log_index_changes(connection, name, ids):
+    rows = [{'table_name': name, 'row_id': id} for id in sorted(set(ids))]
+    if rows:
+        connection.execute(index_changes.insert(), rows)
+
+
+# SQLite only enforces foreign keys, and so ON DELETE CASCADE, when asked to
+@db.event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
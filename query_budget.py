@@ -0,0 +1,54 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query budget.
+#----------------------------------------------------------------------------#
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# count every statement sent to the database while a budgeted view runs
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_budget_count' in g:
+        g.query_budget_count += 1
+
+
+def budget_exceeded(endpoint, count, max_queries):
+    # QUERY_BUDGET_ACTION is 'log', 'raise' or a callable taking the same
+    # arguments as this function
+    action = current_app.config.get('QUERY_BUDGET_ACTION', 'log')
+    if callable(action):
+        action(endpoint, count, max_queries)
+    elif action == 'raise':
+        raise QueryBudgetExceeded(
+            f'{endpoint} ran {count} queries, budget is {max_queries}')
+    else:
+        current_app.logger.warning(
+            f'{endpoint} ran {count} queries, budget is {max_queries}')
+
+
+# declares how many statements a view may run, template rendering included
+def query_budget(max_queries):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            g.query_budget_count = 0
+            try:
+                response = f(*args, **kwargs)
+            finally:
+                count = g.pop('query_budget_count', 0)
+            if count > max_queries:
+                budget_exceeded(request.endpoint, count, max_queries)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from flask import Response, g, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import reads_own_writes
+from models import Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+
+# in-process backend. Pages are evicted least recently used first once
+# max_entries is reached. The tag invalidation times are kept apart until
+# they expire, however many there are: evicting one early would let the
+# pages it invalidated be served again. Expired ones are swept out whenever
+# their number has doubled since the last sweep.
+#
+# A shared backend (memcached, redis, ...) only needs the same get/set/clear
+# methods and is passed in through RESPONSE_CACHE_BACKEND.
+class LRUCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.sweep_at = max_entries
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            store = self.tags if key.startswith('tag:') else self.entries
+            item = store.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del store[key]
+                return None
+            if store is self.entries:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            expires = time.time() + ttl
+            if key.startswith('tag:'):
+                self.tags[key] = (value, expires)
+                if len(self.tags) >= self.sweep_at:
+                    now = time.time()
+                    self.tags = {tag: item for tag, item in self.tags.items()
+                                 if item[1] >= now}
+                    self.sweep_at = max(self.max_entries, 2 * len(self.tags))
+                return
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+
+# caches whole GET responses per URL. Every cached page lists the tags it
+# depends on ('venues', 'venue:3', ...); a write invalidates the tags of the
+# rows it touches by recording when it committed, and a cached page is only
+# served if it was rendered after all of its tags were last invalidated.
+#
+# Tags only see ORM writes committed in this process. Pages behind
+# @conditional are also stored with the ETag of their validators and only
+# served under the same one, which catches Core writes (`flask import`,
+# `flask geocode`, ...) and writes made by other workers as well. So that
+# a hot page is served without touching the database, @conditional serves
+# a page whose ETag was checked less than RESPONSE_CACHE_REVALIDATE_SECONDS
+# ago without running its validators (see fresh()); those other writes show
+# up once that many seconds have passed.
+#
+# With a read replica, pages rendered from it are stored apart from those
+# rendered from the primary, as they may lag behind it. Clients reading
+# their own writes from the primary skip the cache altogether: a page
+# another client rendered, even after the write, may come from the replica
+class ResponseCache:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        event.listen(Session, 'before_flush', self.collect_tags)
+        event.listen(Session, 'after_commit', self.invalidate_pending)
+        event.listen(Session, 'after_rollback', self.discard_pending)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        self.revalidate = app.config.get('RESPONSE_CACHE_REVALIDATE_SECONDS', 5)
+        self.backend = app.config.get('RESPONSE_CACHE_BACKEND') or \
+            LRUCache(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+        app.extensions['response_cache'] = self
+
+    def invalidate(self, *tags):
+        now = time.time()
+        for tag in tags:
+            # a page rendered before then has expired by the time the tag
+            # does, as it is not renewed once invalidated
+            self.backend.set('tag:' + tag, now, self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def lookup(self, key):
+        entry = self.backend.get('page:' + key)
+        if entry is None:
+            return None
+        for tag in entry['tags']:
+            invalidated = self.backend.get('tag:' + tag)
+            if invalidated is not None and invalidated >= entry['rendered']:
+                return None
+        return entry
+
+    # flashed messages are rendered into the page for one user only
+    def bypassed(self):
+        return not self.enabled or request.method != 'GET' or '_flashes' in session \
+            or reads_own_writes()
+
+    def key(self):
+        if g.get('read_from_replica'):
+            return 'replica:' + request.full_path
+        return request.full_path
+
+    # the entry @conditional may serve without running its validators: one
+    # stored under an ETag checked against the database less than
+    # RESPONSE_CACHE_REVALIDATE_SECONDS ago
+    def fresh(self):
+        if self.bypassed():
+            return None
+        entry = self.lookup(self.key())
+        if entry is None or entry['etag'] is None or \
+                time.time() - entry['validated'] >= self.revalidate:
+            return None
+        self.stats[request.endpoint]['hits'] += 1
+        return entry
+
+    def respond(self, entry):
+        response = Response(entry['body'], entry['status'], entry['headers'])
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def cached(self, *tags):
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if self.bypassed():
+                    return f(*args, **kwargs)
+
+                key = self.key()
+                # set by @conditional from the validators
+                etag = g.get('etag')
+                stats = self.stats[request.endpoint]
+                entry = self.lookup(key)
+                if entry is not None and entry['etag'] == etag:
+                    stats['hits'] += 1
+                    if etag is not None:
+                        # checked again, so fresh() serves it for a while
+                        self.backend.set('page:' + key, dict(entry, validated=time.time()),
+                                         self.ttl)
+                    return self.respond(entry)
+
+                stats['misses'] += 1
+                rendered = time.time()
+                response = f(*args, **kwargs)
+                if not isinstance(response, Response):
+                    response = Response(response)
+                if response.status_code == 200 and 'Set-Cookie' not in response.headers:
+                    entry = {
+                        'rendered': rendered,
+                        'validated': rendered,
+                        'etag': etag,
+                        'last_modified': g.get('last_modified'),
+                        'tags': [tag.format(**kwargs) for tag in tags],
+                        'status': response.status_code,
+                        'headers': list(response.headers),
+                    }
+                    if response.is_streamed:
+                        response.response = self.store_streamed(
+                            key, entry, response.response, response.charset)
+                    else:
+                        entry['body'] = response.get_data()
+                        self.backend.set('page:' + key, entry, self.ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    # passes a streamed page through unchanged and stores it once it has
+    # been sent in full; a page the client stopped reading is not stored
+    def store_streamed(self, key, entry, body, charset):
+        chunks = []
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(charset)
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # lets a streamed template release its request context
+            if hasattr(body, 'close'):
+                body.close()
+        entry['body'] = b''.join(chunks)
+        self.backend.set('page:' + key, entry, self.ttl)
+
+    # works out which cached pages a flush makes stale. Runs before the
+    # flush so shows removed by the database along with their venue or
+    # artist can still be looked up
+    def collect_tags(self, session, flush_context, instances):
+        tags = session.info.setdefault('response_cache_tags', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Show):
+                tags.update(('shows', 'venues', f'venue:{obj.venue_id}',
+                             f'artist:{obj.artist_id}'))
+            elif isinstance(obj, Venue):
+                tags.update(('venues', 'shows'))
+                if obj.id is not None:
+                    tags.add(f'venue:{obj.id}')
+                    with session.no_autoflush:
+                        artist_ids = session.query(Show.artist_id) \
+                            .filter(Show.venue_id == obj.id).distinct()
+                        tags.update(f'artist:{id}' for id, in artist_ids)
+            elif isinstance(obj, Artist):
+                tags.update(('artists', 'shows'))
+                if obj.id is not None:
+                    tags.add(f'artist:{obj.id}')
+                    with session.no_autoflush:
+                        venue_ids = session.query(Show.venue_id) \
+                            .filter(Show.artist_id == obj.id).distinct()
+                        tags.update(f'venue:{id}' for id, in venue_ids)
+
+    def invalidate_pending(self, session):
+        tags = session.info.pop('response_cache_tags', None)
+        if tags:
+            self.invalidate(*tags)
+
+    def discard_pending(self, session):
+        session.info.pop('response_cache_tags', None)
@@ -0,0 +1,425 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session, object_session
+
+#----------------------------------------------------------------------------#
+# Trigram index.
+#----------------------------------------------------------------------------#
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# in-memory inverted index answering case-insensitive substring queries on
+# names, the same matches as ilike('%term%'). Each process keeps its own
+# copy, built from the database and kept current by the model events and
+# IndexSync below
+class TrigramIndex:
+    def __init__(self, model):
+        self.model = model
+        self.names = {}
+        self.postings = defaultdict(set)
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def entry(self, target):
+        return target.name
+
+    def add(self, id, name):
+        with self.lock:
+            self._remove(id)
+            self.names[id] = name
+            for gram in trigrams(name.lower()):
+                self.postings[gram].add(id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for gram in trigrams(name.lower()):
+            ids = self.postings[gram]
+            ids.discard(id)
+            if not ids:
+                del self.postings[gram]
+
+    def build(self, session):
+        # built aside and swapped in, so searches keep using the old copy
+        # while IndexSync rebuilds it
+        names = {}
+        postings = defaultdict(set)
+        for id, name in session.query(self.model.id, self.model.name):
+            names[id] = name
+            for gram in trigrams(name.lower()):
+                postings[gram].add(id)
+        with self.lock:
+            self.names, self.postings = names, postings
+        self.ready = True
+
+    # returns [(id, name)] ordered by id, or None while the index is cold
+    def search(self, term):
+        if not self.ready:
+            return None
+        term = term.lower()
+        with self.lock:
+            grams = trigrams(term)
+            if grams:
+                # start from the rarest trigram to keep the intersection small
+                postings = sorted((self.postings.get(gram, set())
+                                   for gram in grams), key=len)
+                candidates = set.intersection(*postings)
+            else:
+                # terms shorter than a trigram match against every name
+                candidates = self.names.keys()
+            return sorted((id, self.names[id]) for id in candidates
+                          if term in self.names[id].lower())
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+WORDS = re.compile(r'\w+')
+# prefixes matching more keys than this have their top results memoized
+# until the next change, so one-letter prefixes cost a dict lookup
+SCAN_LIMIT = 1000
+MAX_COMPLETIONS = 50
+
+
+def normalize(text):
+    return ' '.join(WORDS.findall(text.casefold()))
+
+
+def word_suffixes(name):
+    # 'The Blue Owls' -> 'the blue owls', 'blue owls', 'owls', so a prefix
+    # matches the start of any word
+    words = WORDS.findall(name.casefold())
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+# in-memory index of names for typeahead: a sorted array of word suffixes
+# searched with bisect, each completion ranked by the entity's upcoming
+# show count. Kept current like TrigramIndex, plus the show events below
+class PrefixIndex:
+    def __init__(self, model):
+        self.model = model
+        self.names = {}
+        self.upcoming = {}
+        self.keys = []
+        self.top = {}
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def entry(self, target):
+        return target.name, target.upcoming_shows_count or 0
+
+    def add(self, id, entry):
+        name, upcoming = entry
+        with self.lock:
+            self._remove(id)
+            self.names[id] = name
+            self.upcoming[id] = upcoming
+            for key in word_suffixes(name):
+                insort(self.keys, (key, id))
+            self.top.clear()
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+            self.top.clear()
+
+    def _remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        del self.upcoming[id]
+        for key in word_suffixes(name):
+            i = bisect_left(self.keys, (key, id))
+            if i < len(self.keys) and self.keys[i] == (key, id):
+                del self.keys[i]
+
+    def adjust(self, id, delta):
+        with self.lock:
+            if id in self.upcoming:
+                self.upcoming[id] = max(0, self.upcoming[id] + delta)
+                self.top.clear()
+
+    def build(self, session):
+        names = {}
+        upcoming = {}
+        keys = []
+        query = session.query(self.model.id, self.model.name,
+                              self.model.upcoming_shows_count)
+        for id, name, count in query:
+            names[id] = name
+            upcoming[id] = count or 0
+            keys.extend((key, id) for key in word_suffixes(name))
+        keys.sort()
+        with self.lock:
+            self.names, self.upcoming, self.keys = names, upcoming, keys
+            self.top.clear()
+        self.ready = True
+
+    def rank(self, id):
+        return (-self.upcoming[id], self.names[id].casefold(), id)
+
+    # returns up to limit [(upcoming, name, id)] for names with a word
+    # starting with prefix, most upcoming shows first; None while cold
+    def complete(self, prefix, limit):
+        if not self.ready:
+            return None
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            best = self.top.get(prefix)
+            if best is None:
+                lo = bisect_left(self.keys, (prefix,))
+                hi = bisect_left(self.keys, (prefix + '\U0010ffff',))
+                ids = {id for _, id in self.keys[lo:hi]}
+                if hi - lo <= SCAN_LIMIT:
+                    best = heapq.nsmallest(limit, ids, key=self.rank)
+                else:
+                    best = heapq.nsmallest(MAX_COMPLETIONS, ids, key=self.rank)
+                    self.top[prefix] = best
+            return [(self.upcoming[id], self.names[id], id) for id in best[:limit]]
+
+#----------------------------------------------------------------------------#
+# Keeping indexes current.
+#----------------------------------------------------------------------------#
+
+
+# changes are queued on the session at flush time and only applied once the
+# transaction commits, so rolled back writes never reach the index
+def pending(session):
+    return session.info.setdefault('search_index_pending', [])
+
+
+def track(index):
+    def queue(mapper, connection, target, op):
+        pending(object_session(target)).append((index, op, target.id, index.entry(target)))
+
+    event.listen(index.model, 'after_insert',
+                 lambda m, c, t: queue(m, c, t, 'add'))
+    event.listen(index.model, 'after_update',
+                 lambda m, c, t: queue(m, c, t, 'add'))
+    event.listen(index.model, 'after_delete',
+                 lambda m, c, t: queue(m, c, t, 'remove'))
+
+
+# moves the rank of the venue or artist a show belongs to as upcoming shows
+# are created and deleted; shows that start as time passes only drop out
+# of the ranking on the next build
+def track_upcoming(index, show_model, owner_column):
+    def queue(mapper, connection, show, delta):
+        if show.start_time > datetime.now():
+            # ids set from form data are still strings after the flush
+            pending(object_session(show)).append(
+                (index, 'adjust', int(getattr(show, owner_column)), delta))
+
+    event.listen(show_model, 'after_insert', lambda m, c, t: queue(m, c, t, 1))
+    event.listen(show_model, 'after_delete', lambda m, c, t: queue(m, c, t, -1))
+
+
+# shows removed by ON DELETE CASCADE along with their venue or artist fire
+# no events; as counters.recount_cascaded() does, read the upcoming shows of
+# the parent before it goes and take them off the other side's ranks
+def track_cascaded_upcoming(index, parent_model, parent_column, owner_column):
+    start_time = owner_column.table.c.start_time
+
+    def queue(mapper, connection, parent):
+        rows = connection.execute(
+            select(owner_column, func.count())
+            .where(parent_column == parent.id, start_time > datetime.now())
+            .group_by(owner_column)).all()
+        for owner_id, count in rows:
+            pending(object_session(parent)).append((index, 'adjust', owner_id, -count))
+
+    event.listen(parent_model, 'before_delete', queue)
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_pending(session):
+    session.info.pop('search_index_logged', None)
+    for index, op, id, value in session.info.pop('search_index_pending', []):
+        if op == 'add':
+            index.add(id, value)
+        elif op == 'adjust':
+            index.adjust(id, value)
+        else:
+            index.remove(id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_pending(session):
+    session.info.pop('search_index_pending', None)
+    session.info.pop('search_index_logged', None)
+
+
+#----------------------------------------------------------------------------#
+# Keeping processes in step.
+#
+# The events above only reach the indexes of the process that commits, and
+# gunicorn workers each have their own copy. So every flush also logs the
+# ids it queued (see log_changes() below), as `flask import` and `flask
+# geocode` do for their Core writes, and each process reads the log back:
+# at most every SEARCH_INDEX_SYNC_SECONDS a request reads the rows past the
+# last one it applied and reloads those venues and artists, its own writes
+# included. Longer backlogs, and processes that have not looked for longer
+# than the log is kept, rebuild the indexes in a background thread instead
+# while searches use the old copy.
+#----------------------------------------------------------------------------#
+
+# backlogs longer than this are rebuilt rather than reloaded row by row
+SYNC_LIMIT = 500
+# PostgreSQL hands out ids as rows are inserted, not as they commit, so ids
+# skipped over by a read are read again until they turn up or this long
+# has passed, as rolled back ones never do
+GAP_SECONDS = 300
+# how often each process deletes the rows kept longer than
+# SEARCH_INDEX_CHANGES_KEEP_HOURS
+PRUNE_SECONDS = 3600
+
+
+# logs the ids queued by each flush with write(connection, table name, ids),
+# in the same transaction, so rolled back writes are never logged either
+def log_changes(write):
+    def log(session, flush_context):
+        queued = pending(session)
+        ids = defaultdict(set)
+        for index, op, id, value in queued[session.info.get('search_index_logged', 0):]:
+            ids[index.model.__tablename__].add(id)
+        session.info['search_index_logged'] = len(queued)
+        for name, changed in ids.items():
+            write(session.connection(), name, changed)
+
+    event.listen(Session, 'after_flush_postexec', log)
+
+
+class IndexSync:
+    def __init__(self, app, db, changes, indexes):
+        self.app = app
+        self.db = db
+        # models.index_changes
+        self.changes = changes
+        self.indexes = indexes
+        self.models = {index.model.__tablename__: index.model for index in indexes}
+        self.interval = app.config['SEARCH_INDEX_SYNC_SECONDS']
+        self.keep = timedelta(hours=app.config['SEARCH_INDEX_CHANGES_KEEP_HOURS'])
+        # the last change applied, None until the indexes are first built
+        self.applied = None
+        # {id skipped over: when}
+        self.gaps = {}
+        self.checked = self.pruned = time.monotonic()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # changes logged while the indexes are built are reloaded afterwards,
+    # as the build may or may not have read them
+    def build(self):
+        with self.app.app_context():
+            try:
+                start = self.db.session.query(func.max(self.changes.c.id)).scalar() or 0
+                for index in self.indexes:
+                    try:
+                        index.build(self.db.session)
+                    except Exception as e:
+                        self.app.logger.warning(
+                            f'Could not build {index.model.__name__} search index: {e}')
+            except Exception as e:
+                # tried again on the next check
+                self.app.logger.warning(f'Could not build the search indexes: {e}')
+                return
+            finally:
+                self.db.session.remove()
+        with self.lock:
+            self.applied = start
+            self.gaps.clear()
+
+    # builds the indexes in the background so startup is not blocked;
+    # searches fall back to SQL until an index is ready
+    def rebuild(self):
+        self.thread = threading.Thread(target=self.build, name='search-index-build',
+                                       daemon=True)
+        self.thread.start()
+        return self.thread
+
+    # run before each request; only one request per interval reads the log
+    def check(self):
+        now = time.monotonic()
+        if now - self.checked < self.interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            if now - self.checked < self.interval or \
+                    (self.thread is not None and self.thread.is_alive()):
+                return
+            missed = now - self.checked > self.keep.total_seconds()
+            self.checked = now
+            if self.applied is None or missed:
+                self.rebuild()
+                return
+            with Session(self.db.engine) as session:
+                self.sync(session, now)
+        except Exception as e:
+            self.app.logger.warning(f'Could not sync the search indexes: {e}')
+        finally:
+            self.lock.release()
+
+    def sync(self, session, now):
+        changes = self.changes.c
+        rows = session.execute(
+            select(changes.id, changes.table_name, changes.row_id)
+            .where(or_(changes.id > self.applied, changes.id.in_(list(self.gaps))))
+            .order_by(changes.id).limit(SYNC_LIMIT + 1)).all()
+        found = {id for id, _, _ in rows}
+        last = max(found | {self.applied})
+        skipped = [id for id in range(self.applied + 1, last) if id not in found]
+        if len(rows) > SYNC_LIMIT or len(skipped) > SYNC_LIMIT:
+            self.rebuild()
+            return
+
+        ids = defaultdict(set)
+        for id, name, row_id in rows:
+            ids[name].add(row_id)
+        for name, changed in ids.items():
+            if name in self.models:
+                self.reload(session, self.models[name], changed)
+
+        self.applied = last
+        for id in found:
+            self.gaps.pop(id, None)
+        for id in skipped:
+            self.gaps[id] = now
+        for id, since in list(self.gaps.items()):
+            if now - since > GAP_SECONDS:
+                del self.gaps[id]
+
+        if now - self.pruned > PRUNE_SECONDS:
+            self.pruned = now
+            session.execute(self.changes.delete()
+                            .where(changes.changed_at < datetime.utcnow() - self.keep))
+            session.commit()
+
+    def reload(self, session, model, ids):
+        found = {target.id: target
+                 for target in session.query(model).filter(model.id.in_(ids))}
+        for index in self.indexes:
+            if index.model is model:
+                for id in ids:
+                    if id in found:
+                        index.add(id, index.entry(found[id]))
+                    else:
+                        index.remove(id)
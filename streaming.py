@@ -0,0 +1,53 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import (Response, before_render_template, current_app, render_template, session,
+                   stream_with_context, template_rendered)
+
+#----------------------------------------------------------------------------#
+# Streamed rendering.
+#
+# The listing views hand their templates generators of rows read from an
+# open cursor, and render_listing() sends the page out chunk by chunk as the
+# template walks them, so the first bytes leave after the first batch of
+# rows and memory stays the same however long the list gets.
+#
+# The view still runs its query before it returns, so query_budget sees it;
+# only the rendering happens afterwards, inside the request context kept
+# alive by stream_with_context. Headers, and with them the Server-Timing
+# figures, are sent before the body is rendered.
+#----------------------------------------------------------------------------#
+
+
+# same as Flask 2.2's stream_template: the signals are sent around the whole
+# stream, so template_rendered fires once the last chunk has been rendered
+def stream_template(template_name, **context):
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+
+    def generate():
+        before_render_template.send(app, template=template, context=context)
+        stream = template.stream(context)
+        # a write per few dozen template chunks rather than per chunk
+        stream.enable_buffering(app.config.get('STREAM_BUFFER_SIZE', 64))
+        yield from stream
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()))
+
+
+# pages showing flashed messages are rendered whole: the layout pops them
+# from the session, which a streamed page could only do after sending the
+# session cookie, so they would be shown again on every page
+def render_listing(template_name, **context):
+    if current_app.config.get('STREAM_LISTINGS', True) and '_flashes' not in session:
+        return stream_template(template_name, **context)
+    return render_template(template_name, **context)
+
+
+# runs the query now and returns an iterator over its rows, fetched from the
+# cursor in batches (a server-side cursor on PostgreSQL)
+def iterate(query):
+    return iter(query.yield_per(current_app.config.get('STREAM_BATCH_SIZE', 500)))
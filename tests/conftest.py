@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------------#
+# Shared fixtures.
+#
+# Tests run the app against temporary SQLite databases created with
+# db.create_all(). make_app builds one from config.py with the settings
+# below, which a test module can extend by overriding the settings fixture.
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# after the app's modules, some of which share a name with a benchmark
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
+import config  # noqa: E402
+import genres  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+def make_config(url, **overrides):
+    settings = {name: value for name, value in vars(config).items() if name.isupper()}
+    settings.update(
+        SQLALCHEMY_DATABASE_URI=url,
+        SQLALCHEMY_BINDS=None,
+        TESTING=True,
+        SECRET_KEY='test',
+        QUERY_BUDGET_ACTION='raise',
+        # the SQL fallbacks, and every page rendered from the database
+        SEARCH_INDEX_ENABLED=False,
+        RESPONSE_CACHE_ENABLED=False,
+        MIGRATIONS_ENABLED=False,
+        REQUEST_LOG=None,
+        SLOW_QUERY_LOG=None,
+    )
+    settings.update(overrides)
+    return type('TestConfig', (), settings)
+
+
+@pytest.fixture(scope='session')
+def make_app():
+    def make(url, **overrides):
+        app = create_app(make_config(url, **overrides))
+        # genre ids are cached per process, and each app has a new database
+        genres.genre_ids.clear()
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+
+@pytest.fixture
+def settings():
+    return {}
+
+
+# an empty database for one test
+@pytest.fixture
+def app(make_app, settings, tmp_path):
+    app = make_app('sqlite:///' + str(tmp_path / 'fyyur.db'), **settings)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
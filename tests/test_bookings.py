@@ -0,0 +1,78 @@
+#----------------------------------------------------------------------------#
+# Double bookings.
+#
+# book() refuses a show overlapping a booked show of its venue or artist,
+# and show_conflicts() finds the overlaps that bulk imports let in. SQLite
+# has no exclusion constraints, so these cover the checks themselves.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import bookings
+from models import db, Venue, Artist, Show
+
+START = datetime(2030, 1, 1, 20, 0)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def owners(app):
+    with app.app_context():
+        venues = [Venue(name=f'Venue {i}', city='Austin', state='TX', address=f'{i} Main St')
+                  for i in range(2)]
+        artists = [Artist(name=f'Artist {i}', city='Austin', state='TX') for i in range(2)]
+        db.session.add_all(venues + artists)
+        db.session.commit()
+        yield [venue.id for venue in venues], [artist.id for artist in artists]
+        db.session.remove()
+
+
+def show(venue_id, artist_id, start, hours=2):
+    return Show(venue_id=venue_id, artist_id=artist_id, start_time=start,
+                end_time=start + hours * HOUR)
+
+
+def test_book_refuses_overlapping_shows(owners):
+    (venue, other_venue), (artist, other_artist) = owners
+    assert bookings.book(show(venue, artist, START)) == []
+    db.session.commit()
+
+    found = bookings.book(show(venue, other_artist, START + HOUR))
+    assert [(kind, other.start_time) for kind, other in found] == [('venue', START)]
+    db.session.rollback()
+
+    found = bookings.book(show(other_venue, artist, START - HOUR))
+    assert [kind for kind, _ in found] == ['artist']
+    db.session.rollback()
+    assert db.session.query(Show).count() == 1
+
+
+def test_book_accepts_back_to_back_shows(owners):
+    (venue, _), (artist, other_artist) = owners
+    assert bookings.book(show(venue, artist, START)) == []
+    # [start_time, end_time): a show may start as the previous one ends
+    assert bookings.book(show(venue, other_artist, START + 2 * HOUR)) == []
+    assert bookings.book(show(venue, artist, START - 2 * HOUR)) == []
+    db.session.commit()
+    assert db.session.query(Show).count() == 3
+
+
+def test_show_conflicts_lists_overlapping_pairs(owners):
+    (venue, other_venue), (artist, other_artist) = owners
+    # inserted as bulk imports do, without book()
+    db.session.add_all([
+        show(venue, artist, START, hours=3),
+        show(venue, other_artist, START + HOUR),
+        show(other_venue, other_artist, START + 2 * HOUR),
+        show(other_venue, artist, START + 5 * HOUR),
+    ])
+    db.session.commit()
+
+    found = [(kind, owner_id, earlier.start_time, later.start_time)
+             for kind, owner_id, earlier, later in bookings.show_conflicts(batch_size=2)]
+    assert found == [
+        ('venue', venue, START, START + HOUR),
+        ('artist', other_artist, START + HOUR, START + 2 * HOUR),
+    ]
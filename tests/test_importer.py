@@ -0,0 +1,46 @@
+#----------------------------------------------------------------------------#
+# Show references in `flask import`.
+#
+# Show rows name their venue and artist by id or by (name, city, state).
+# Rows naming none that exists, or with a start time that does not parse,
+# are counted as skipped and the rest of the batch is imported.
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import datetime
+
+import importer
+from models import db, Venue, Artist, Show
+
+
+def test_show_rows_with_unknown_references_are_skipped(app, tmp_path):
+    with app.app_context():
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      address='1015 Folsom Street')
+        artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        venue_id, artist_id = venue.id, artist.id
+
+        rows = [
+            {'venue_id': venue_id, 'artist_id': artist_id,
+             'start_time': '2035-04-01T20:00:00'},
+            {'venue_name': 'The Musical Hop', 'venue_city': 'San Francisco',
+             'venue_state': 'CA', 'artist_name': 'Guns N Petals',
+             'artist_city': 'San Francisco', 'artist_state': 'CA',
+             'start_time': '2035-04-02T20:00:00'},
+            {'venue_id': venue_id + 100, 'artist_id': artist_id,
+             'start_time': '2035-04-03T20:00:00'},
+            {'venue_id': 'first', 'artist_id': artist_id,
+             'start_time': '2035-04-04T20:00:00'},
+            {'venue_name': 'The Musical Hop', 'artist_id': artist_id,
+             'start_time': '2035-04-05T20:00:00'},
+            {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': 'soon'},
+        ]
+        path = tmp_path / 'shows.jsonl'
+        path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+
+        stats = importer.import_shows(str(path), batch_size=2)
+        assert (stats.inserted, stats.skipped) == (2, 4)
+        assert sorted(start for start, in db.session.query(Show.start_time)) == [
+            datetime(2035, 4, 1, 20, 0), datetime(2035, 4, 2, 20, 0)]
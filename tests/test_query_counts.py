@@ -0,0 +1,82 @@
+#----------------------------------------------------------------------------#
+# Statement counts of the listing and detail pages.
+#
+#   python -m pytest -q tests
+#
+# Every page below has to run the same number of statements however big
+# the catalog is. Two catalogs, the second ten times the size of the first,
+# are seeded into temporary SQLite databases with benchmarks/catalog.py and
+# each page is requested on both. QUERY_BUDGET_ACTION is 'raise', so a view
+# going over its query_budget fails the request too.
+#----------------------------------------------------------------------------#
+
+import pytest
+from sqlalchemy import event
+
+import catalog
+from models import db, Venue, Artist
+
+# (venues, artists, shows)
+CATALOGS = {
+    'small': (20, 40, 200),
+    'large': (200, 400, 2000),
+}
+
+PAGES = [
+    '/venues',
+    '/venues?genre=Jazz',
+    '/artists',
+    '/shows',
+    '/venues/{venue_id}',
+    '/artists/{artist_id}',
+]
+
+
+@pytest.fixture(scope='module')
+def catalogs(make_app, tmp_path_factory):
+    seeded = {}
+    for name, (venues, artists, shows) in CATALOGS.items():
+        url = 'sqlite:///' + str(tmp_path_factory.mktemp(name) / 'fyyur.db')
+        app = make_app(url)
+        with app.app_context():
+            catalog.seed(db, venues, artists, shows)
+            # seeking venues and artists also list their matches
+            ids = {
+                'venue_id': db.session.query(db.func.min(Venue.id))
+                .filter(Venue.seeking_talent.is_(True)).scalar(),
+                'artist_id': db.session.query(db.func.min(Artist.id))
+                .filter(Artist.seeking_venue.is_(True)).scalar(),
+            }
+            engine = db.engine
+            db.session.remove()
+        seeded[name] = (app, engine, ids)
+    yield seeded
+    for _, engine, _ in seeded.values():
+        engine.dispose()
+
+
+def count_statements(app, engine, path):
+    count = 0
+
+    def counter(conn, cursor, statement, parameters, context, executemany):
+        nonlocal count
+        count += 1
+
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        response = app.test_client().get(path)
+        # streamed listings run their queries before returning, but read
+        # them to the end anyway
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+    assert response.status_code == 200, path
+    return count
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_statements_do_not_grow_with_catalog(catalogs, page):
+    counts = {}
+    for name, (app, engine, ids) in catalogs.items():
+        counts[name] = count_statements(app, engine, page.format(**ids))
+    assert counts['small'] == counts['large'], counts
@@ -0,0 +1,88 @@
+#----------------------------------------------------------------------------#
+# Response cache invalidation.
+#
+# Pages are cached under the tags of the venues, artists and shows they
+# list, and a commit changing any of those drops them, so the next request
+# renders the change at once.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def settings():
+    return {'RESPONSE_CACHE_ENABLED': True}
+
+
+@pytest.fixture
+def venue_id(app):
+    with app.app_context():
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      address='1015 Folsom Street')
+        db.session.add(venue)
+        db.session.commit()
+        return venue.id
+
+
+def get(client, path):
+    response = client.get(path)
+    return response.headers.get('X-Cache'), response.get_data(as_text=True)
+
+
+def test_repeated_requests_are_served_from_the_cache(app, venue_id):
+    client = app.test_client()
+    assert get(client, f'/venues/{venue_id}')[0] == 'MISS'
+    assert get(client, f'/venues/{venue_id}')[0] == 'HIT'
+
+
+def test_editing_a_venue_drops_its_pages(app, venue_id):
+    client = app.test_client()
+    for path in (f'/venues/{venue_id}', '/venues'):
+        get(client, path)
+        assert get(client, path)[0] == 'HIT'
+
+    with app.app_context():
+        db.session.get(Venue, venue_id).name = 'The Dueling Pianos Bar'
+        db.session.commit()
+
+    for path in (f'/venues/{venue_id}', '/venues'):
+        cached, body = get(client, path)
+        assert cached == 'MISS', path
+        assert 'The Dueling Pianos Bar' in body, path
+
+
+def test_booking_a_show_drops_the_pages_listing_it(app, venue_id):
+    client = app.test_client()
+    get(client, f'/venues/{venue_id}')
+    get(client, '/shows')
+
+    with app.app_context():
+        artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+        db.session.add(artist)
+        db.session.flush()
+        db.session.add(Show(venue_id=venue_id, artist_id=artist.id,
+                            start_time=datetime(2035, 4, 1, 20, 0)))
+        db.session.commit()
+
+    for path in (f'/venues/{venue_id}', '/shows'):
+        cached, body = get(client, path)
+        assert cached == 'MISS', path
+        assert 'Guns N Petals' in body, path
+
+
+def test_rolled_back_changes_keep_the_cache(app, venue_id):
+    client = app.test_client()
+    get(client, f'/venues/{venue_id}')
+
+    with app.app_context():
+        db.session.get(Venue, venue_id).name = 'Never Saved'
+        db.session.flush()
+        db.session.rollback()
+
+    cached, body = get(client, f'/venues/{venue_id}')
+    assert cached == 'HIT'
+    assert 'Never Saved' not in body
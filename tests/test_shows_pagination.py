@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination of /shows.
+#
+# Pages follow each other by the (start_time, id) cursors in their Older
+# and Newer links. Walking them must list every show once, newest first,
+# including shows that start at the same time on either side of a page
+# boundary.
+#----------------------------------------------------------------------------#
+
+import html
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+PER_PAGE = 3
+START = datetime(2030, 6, 1, 20, 0)
+# pairs of shows at the same time, which only their ids order
+STARTS = [START + timedelta(days=day // 2) for day in range(8)]
+
+
+@pytest.fixture
+def show_artists(app):
+    # one artist per show, so each show is told apart by its artist link
+    with app.app_context():
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                      address='1015 Folsom Street')
+        artists = [Artist(name=f'Artist {i}', city='San Francisco', state='CA')
+                   for i in range(len(STARTS))]
+        db.session.add_all([venue] + artists)
+        db.session.flush()
+        shows = [Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time)
+                 for artist, start_time in zip(artists, STARTS)]
+        db.session.add_all(shows)
+        db.session.commit()
+        newest_first = sorted(shows, key=lambda show: (show.start_time, show.id), reverse=True)
+        return [show.artist_id for show in newest_first]
+
+
+def get_page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, url
+    body = response.get_data(as_text=True)
+    artist_ids = [int(id) for id in re.findall(r'href="/artists/(\d+)"', body)]
+    links = {rel: html.unescape(href) for rel, href in
+             re.findall(r'<li class="(previous|next)"><a href="([^"]+)"', body)}
+    return artist_ids, links
+
+
+def test_older_links_walk_every_show_once(app, show_artists):
+    client = app.test_client()
+    url = f'/shows?per_page={PER_PAGE}'
+    pages = []
+    while url:
+        artist_ids, links = get_page(client, url)
+        pages.append(artist_ids)
+        url = links.get('next')
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert sum(pages, []) == show_artists
+
+
+def test_newer_links_lead_back_to_the_previous_page(app, show_artists):
+    client = app.test_client()
+    first, links = get_page(client, f'/shows?per_page={PER_PAGE}')
+    assert 'previous' not in links
+    second, links = get_page(client, links['next'])
+    third, links = get_page(client, links['next'])
+    assert 'next' not in links
+
+    back, links = get_page(client, links['previous'])
+    assert back == second
+    back, links = get_page(client, links['previous'])
+    assert back == first
+    assert 'previous' not in links
+
+
+def test_malformed_cursor_is_a_bad_request(app, show_artists):
+    assert app.test_client().get('/shows?after=yesterday').status_code == 400